@@ -0,0 +1,329 @@
+"""
+Benchmark chilled descent against the optax / jaxopt optimizers tried in the
+notebooks, on the Rosenbrock potential and on the damped sinusoid fit.
+
+Every case is run the same way: the optimizer step is jit compiled as a
+chunk of steps (timed separately as compile time), then chunks run until the
+loss reaches the problem's target or max_iter steps have passed.  One JSON
+record per case is written, so results can be diffed between commits:
+
+    python bench_optimizers.py --dims 2 10 30 --populations 1000 10000 \\
+        --output bench.jsonl
+
+Fields: problem, dim, optimizer, population, compile_s, step_ms,
+iterations, iterations_to_target, time_to_target_s (null if not reached),
+evals_to_target, final_loss, target, step_memory_bytes (argument + output +
+temporaries of the compiled chunk) and peak_device_bytes (device memory
+high-water mark of the case above what was in use before it, see
+DevicePeak; null on CPU, whose backend keeps no allocator stats).
+"""
+import argparse
+import dataclasses
+import json
+import platform
+import sys
+import time
+from typing import Any
+
+import jax
+import jax.numpy as jnp
+import jaxopt
+import numpy as np
+import optax
+from jax import lax
+
+from chilled_descent.chilled_descent import ChilledDescent, rosenbrock
+
+
+@dataclasses.dataclass
+class Problem:
+    name: str
+    loss: Any
+    x0: Any
+    target: float
+    # Learning rates for the optax optimizers
+    learning_rates: Any
+    # Spread of the chilled descent population around x0
+    population_sigma: float = 1.
+
+    @property
+    def dim(self):
+        return self.x0.shape[0]
+
+
+def rosenbrock_problem(dim, target=1e-3):
+    x0 = jnp.tile(jnp.array([-1.2, 1.]), (dim + 1) // 2)[:dim]
+    return Problem(
+        name='rosenbrock',
+        loss=rosenbrock,
+        x0=x0,
+        target=target,
+        learning_rates={'adam': 1e-2, 'sgd_nesterov': 1e-4},
+        population_sigma=2.,
+    )
+
+
+def model(w, t):
+    a = w[0]
+    f = w[1]
+    t0 = w[2]
+    gamma = w[3]
+    y = a * jnp.sin(2 * np.pi * f * (t - t0)) * jnp.exp(gamma * t)
+    return y
+
+
+def fit_problem(num_points=600, noise=5.5, seed=0):
+    """
+    The damped sinusoid fit from the JaxMLE notebooks.  The target is the
+    loss at the true parameters, i.e. a fit as good as the truth.
+    """
+    t = jnp.linspace(0, 2 * np.pi, num_points)
+    w_true = jnp.array([2., .5, np.pi, 1 / 3.])
+    rng = np.random.default_rng(seed)
+    y = model(w_true, t) + noise * jnp.asarray(rng.standard_normal(num_points), dtype=jnp.float32)
+
+    def loss(w):
+        return jnp.sum((model(w, t) - y) ** 2)
+
+    return Problem(
+        name='model_fit',
+        loss=loss,
+        x0=jnp.array([10, .4, 3., .5]),
+        target=float(loss(w_true)),
+        learning_rates={'adam': .09, 'sgd_nesterov': 1e-6},
+        population_sigma=.5,
+    )
+
+
+# -- Optimizer adapters --------------------------------------------------
+# Each returns (init(x0) -> state, step(state) -> state, loss(state),
+# evals_per_step or None to count function evaluations).
+
+
+def optax_adapter(transform):
+    def make(problem, fun=None):
+        loss_and_grad = jax.value_and_grad(fun or problem.loss)
+
+        def init(x0):
+            return x0, transform.init(x0)
+
+        def step(state):
+            x, opt_state = state
+            _, grads = loss_and_grad(x)
+            updates, opt_state = transform.update(grads, opt_state, x)
+            return optax.apply_updates(x, updates), opt_state
+
+        return init, step, lambda state: problem.loss(state[0]), 1
+    return make
+
+
+def jaxopt_adapter(solver_class, **options):
+    def make(problem, fun=None):
+        solver = solver_class(fun=fun or problem.loss, **options)
+
+        def init(x0):
+            return x0, solver.init_state(x0)
+
+        def step(state):
+            return tuple(solver.update(*state))
+
+        return init, step, lambda state: problem.loss(state[0]), None
+    return make
+
+
+def chilled_adapter(population):
+    def make(problem, fun=None):
+        optimizer = ChilledDescent(fun or problem.loss)
+
+        def init(x0):
+            key = jax.random.PRNGKey(0)
+            w0 = x0 + problem.population_sigma * jax.random.normal(key, (population, x0.shape[0]))
+            return optimizer.init(w0)
+
+        return init, optimizer._step, lambda state: state.best_energy, population
+    return make
+
+
+def optimizers(problem, populations):
+    out = {
+        'gd': (jaxopt_adapter(jaxopt.GradientDescent, maxiter=sys.maxsize), None),
+        'lbfgs': (jaxopt_adapter(jaxopt.LBFGS, maxiter=sys.maxsize), None),
+        'sgd_nesterov': (optax_adapter(optax.sgd(
+            problem.learning_rates['sgd_nesterov'], momentum=.9, nesterov=True)), None),
+        'adam': (optax_adapter(optax.adam(problem.learning_rates['adam'])), None),
+    }
+    for population in populations:
+        out[f'chilled_{population}'] = (chilled_adapter(population), population)
+    return out
+
+
+# -- Driver ---------------------------------------------------------------
+
+
+def _chunk_runner(step, chunk):
+    return jax.jit(lambda state: lax.fori_loop(0, chunk, lambda _, s: step(s), state))
+
+
+def count_evals(make, problem, iterations, chunk):
+    """
+    Function evaluations in the first iterations steps, counted in an
+    untimed rerun with a host callback in the loss.
+    """
+    count = [0]
+
+    def counted(x):
+        jax.debug.callback(lambda: count.__setitem__(0, count[0] + 1))
+        return problem.loss(x)
+
+    init, step, _, _ = make(problem, counted)
+    state = init(problem.x0)
+    run_chunk = _chunk_runner(step, chunk)
+    for _ in range(iterations // chunk):
+        state = run_chunk(state)
+    jax.block_until_ready(state)
+    return count[0]
+
+
+def _memory_stats():
+    """
+    Allocator stats of the default device, or None where the backend keeps
+    none (the CPU backend).
+    """
+    return jax.devices()[0].memory_stats() or None
+
+
+class DevicePeak:
+    """
+    Device memory high-water mark of one case, above what was in use when
+    it started.  The allocator's peak_bytes_in_use is cumulative over the
+    process and cannot be reset, so it only counts when this case raised
+    it; otherwise the highest bytes_in_use sampled between chunks is used.
+    """
+
+    def __init__(self):
+        stats = _memory_stats()
+        self.enabled = stats is not None
+        if self.enabled:
+            self.baseline = stats['bytes_in_use']
+            self.previous_peak = stats.get('peak_bytes_in_use', 0)
+            self.sampled = self.baseline
+
+    def sample(self):
+        if self.enabled:
+            self.sampled = max(self.sampled, _memory_stats()['bytes_in_use'])
+
+    def result(self):
+        if not self.enabled:
+            return None
+        self.sample()
+        peak = _memory_stats().get('peak_bytes_in_use', 0)
+        if peak <= self.previous_peak:
+            peak = self.sampled
+        return peak - self.baseline
+
+
+def run_case(problem, name, make, population, max_iter, chunk):
+    device_peak = DevicePeak()
+    init, step, loss_of, evals_per_step = make(problem)
+    state = init(problem.x0)
+    run_chunk = _chunk_runner(step, chunk)
+
+    start = time.perf_counter()
+    compiled = run_chunk.lower(state).compile()
+    compile_s = time.perf_counter() - start
+    memory = compiled.memory_analysis()
+    step_memory = None
+    if memory is not None:
+        step_memory = (memory.argument_size_in_bytes + memory.output_size_in_bytes
+                       + memory.temp_size_in_bytes)
+
+    iterations = 0
+    iterations_to_target = time_to_target = None
+    loss = float(loss_of(state))
+    start = time.perf_counter()
+    while iterations < max_iter:
+        state = compiled(state)
+        iterations += chunk
+        # The loss check is the only host sync per chunk
+        loss = float(loss_of(state))
+        device_peak.sample()
+        if loss <= problem.target:
+            time_to_target = time.perf_counter() - start
+            iterations_to_target = iterations
+            break
+        if not np.isfinite(loss):
+            break
+    elapsed = time.perf_counter() - start
+
+    # Taken before the untimed count_evals() rerun allocates its own state
+    peak_device_bytes = device_peak.result()
+
+    evals = None
+    if iterations_to_target is not None:
+        if evals_per_step is None:
+            evals = count_evals(make, problem, iterations_to_target, chunk)
+        else:
+            evals = evals_per_step * iterations_to_target
+
+    return {
+        'problem': problem.name,
+        'dim': problem.dim,
+        'optimizer': name,
+        'population': population,
+        'compile_s': compile_s,
+        'step_ms': 1e3 * elapsed / iterations,
+        'iterations': iterations,
+        'iterations_to_target': iterations_to_target,
+        'time_to_target_s': time_to_target,
+        'evals_to_target': evals,
+        'final_loss': loss if np.isfinite(loss) else None,
+        'target': problem.target,
+        'step_memory_bytes': step_memory,
+        'peak_device_bytes': peak_device_bytes,
+    }
+
+
+def environment():
+    return {
+        'jax': jax.__version__,
+        'backend': jax.default_backend(),
+        'device': str(jax.devices()[0]),
+        'python': platform.python_version(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chilled descent against optax/jaxopt')
+    parser.add_argument('--dims', type=int, nargs='+', default=[2, 10, 30])
+    parser.add_argument('--populations', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--max-iter', type=int, default=5000)
+    parser.add_argument('--chunk', type=int, default=50)
+    parser.add_argument('--optimizers', nargs='+', help='only run these optimizers')
+    parser.add_argument('--problems', nargs='+', default=['rosenbrock', 'model_fit'])
+    parser.add_argument('--output', help='append JSON lines here instead of stdout')
+    args = parser.parse_args()
+
+    problems = []
+    if 'rosenbrock' in args.problems:
+        problems.extend(rosenbrock_problem(dim) for dim in args.dims)
+    if 'model_fit' in args.problems:
+        problems.append(fit_problem())
+
+    out = open(args.output, 'a') if args.output else sys.stdout
+    env = environment()
+    try:
+        for problem in problems:
+            for name, (make, population) in optimizers(problem, args.populations).items():
+                if args.optimizers and name not in args.optimizers:
+                    continue
+                record = run_case(problem, name, make, population, args.max_iter, args.chunk)
+                record.update(env)
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
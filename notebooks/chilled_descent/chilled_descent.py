@@ -0,0 +1,171 @@
+import dataclasses
+import textwrap
+from typing import Any
+
+import jax
+import jax.numpy as jnp
+from jax import lax
+
+
+def rosenbrock(w):
+    """
+    N dimensional Rosenbrock potential, minimum 0 at w = (1, ..., 1).
+    """
+    return jnp.sum(100 * (w[1:] - w[:-1] ** 2) ** 2 + (1 - w[:-1]) ** 2)
+
+
+def get_initial_balls(N, sigma, seed=10, dim=2):
+    key = jax.random.PRNGKey(seed)
+    w = sigma * jax.random.normal(key, (N, dim))
+    return w
+
+
+@dataclasses.dataclass
+class ChilledDescent:
+    potential: Any
+    evaporate_fraction: float = .25
+    step_scale: float = .5
+    max_iter: int = 1000
+    scan_length: int = 100
+    seed: int = 0
+    callback: Any = None
+    result: Any = dataclasses.field(init=False)
+    temperatures: Any = dataclasses.field(init=False)
+    best_energies: Any = dataclasses.field(init=False)
+
+    @dataclasses.dataclass
+    class State:
+        w: Any = None
+        # Energies of the population before the last step
+        energies: Any = None
+        best_w: Any = None
+        best_energy: Any = None
+        temperature: Any = None
+        step_size: Any = None
+        iteration: Any = None
+        key: Any = None
+
+    example = textwrap.dedent("""
+    w0 = get_initial_balls(N=100_000, sigma=2, dim=10)
+    optimizer = ChilledDescent(rosenbrock, max_iter=2000)
+    state = optimizer.run(w0)
+    state.best_w, state.best_energy
+
+    Every iteration of the population of balls
+      1. takes energies and gradients together (vmapped value_and_grad)
+      2. steps every ball downhill by the mean step size T / mean |grad|,
+         where the temperature T is the mean energy above the minimum
+      3. evaporates the evaporate_fraction highest energy balls (top_k)
+      4. condenses them back as copies of the lowest energy ball
+      5. thermalizes the copies with gaussian noise of the step size
+
+    The population keeps a fixed shape, so one jitted step runs
+    scan_length iterations inside lax.scan without recompiling.  The
+    callback, if given, is called with the State after every scan.
+    """)
+
+    def init(self, w0):
+        w = jnp.asarray(w0, dtype=jnp.float32)
+        energies = jax.vmap(self.potential)(w)
+        best = jnp.argmin(energies)
+        return self.State(
+            w=w,
+            energies=energies,
+            best_w=w[best],
+            best_energy=energies[best],
+            temperature=jnp.mean(energies - energies[best]),
+            step_size=jnp.array(0., dtype=jnp.float32),
+            iteration=jnp.array(0),
+            key=jax.random.PRNGKey(self.seed),
+        )
+
+    def _step(self, state):
+        n, dim = state.w.shape
+        num_evaporated = int(self.evaporate_fraction * n)
+        energy_and_grad = jax.vmap(jax.value_and_grad(self.potential))
+
+        energies, grads = energy_and_grad(state.w)
+        min_energy = jnp.min(energies)
+        temperature = jnp.mean(energies - min_energy)
+        grad_mag = jnp.sqrt(jnp.sum(grads ** 2, axis=1))
+        mean_grad_mag = jnp.mean(grad_mag)
+        # A fully condensed population has no temperature and no gradient
+        step_size = jnp.where(mean_grad_mag > 0, temperature / mean_grad_mag, 0.)
+
+        # Descend: every ball moves step_size along its own downhill direction
+        direction = grads / jnp.maximum(grad_mag, jnp.finfo(grads.dtype).tiny)[:, None]
+        w = state.w - self.step_scale * step_size * direction
+
+        # The best ball seen so far is judged on the energies just computed
+        best = jnp.argmin(energies)
+        improved = energies[best] < state.best_energy
+        best_w = jnp.where(improved, state.w[best], state.best_w)
+        best_energy = jnp.where(improved, energies[best], state.best_energy)
+
+        key = state.key
+        if num_evaporated:
+            # Evaporate the hottest balls and condense them around the
+            # coolest one.  top_k is the only selection, there is no sort.
+            _, hot = lax.top_k(energies, num_evaporated)
+            key, noise_key = jax.random.split(key)
+            sigma = step_size / jnp.sqrt(dim)
+            noise = sigma * jax.random.normal(noise_key, (num_evaporated, dim), dtype=w.dtype)
+            w = w.at[hot].set(w[best] + noise)
+
+        return self.State(
+            w=w,
+            energies=energies,
+            best_w=best_w,
+            best_energy=best_energy,
+            temperature=temperature,
+            step_size=step_size,
+            iteration=state.iteration + 1,
+            key=key,
+        )
+
+    def _run_scan(self, state, length):
+        def body(state, _):
+            state = self._step(state)
+            return state, (state.temperature, state.best_energy)
+        return lax.scan(body, state, None, length=length)
+
+    def _get_run_scan(self):
+        key = (self.potential, self.evaporate_fraction, self.step_scale)
+        cached = self.__dict__.get('_run_scan_cache')
+        if cached is None or cached[0] != key:
+            cached = self.__dict__['_run_scan_cache'] = (
+                key, jax.jit(self._run_scan, static_argnums=1))
+        return cached[1]
+
+    def run(self, w0, num_iter=None):
+        """
+        Optimize from an (N, dim) population w0 (or continue from a State)
+        for num_iter iterations (default max_iter).  Returns the final
+        State, which is also stored in self.result together with the
+        temperature and best energy history.
+        """
+        state = w0 if isinstance(w0, self.State) else self.init(w0)
+        num_iter = self.max_iter if num_iter is None else num_iter
+        run_scan = self._get_run_scan()
+        temperatures, best_energies = [], []
+        done = 0
+        while done < num_iter:
+            # The tail gets its own compiled length only when it differs
+            length = min(self.scan_length, num_iter - done)
+            state, (temperature, best_energy) = run_scan(state, length)
+            temperatures.append(temperature)
+            best_energies.append(best_energy)
+            done += length
+            if self.callback is not None:
+                self.callback(state)
+        self.temperatures = jnp.concatenate(temperatures)
+        self.best_energies = jnp.concatenate(best_energies)
+        self.result = state
+        return state
+
+
+jax.tree_util.register_dataclass(
+    ChilledDescent.State,
+    data_fields=[f.name for f in dataclasses.fields(ChilledDescent.State)],
+    meta_fields=[],
+)
@@ -0,0 +1,260 @@
+import collections
+import dataclasses
+import math
+import textwrap
+from typing import Any
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+
+class TileCache:
+    """
+    LRU cache of evaluated surface tiles, keyed by (potential, slice, tile
+    size, level, tile index).  One cache is shared by every
+    PotentialSurface unless given its own, so max_tiles bounds the memory
+    of all plots together (a 128 x 128 float32 tile is 64 kB).
+    """
+
+    def __init__(self, max_tiles=1024):
+        self.max_tiles = max_tiles
+        self.hits = 0
+        self.misses = 0
+        self._tiles = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def __contains__(self, key):
+        return key in self._tiles
+
+    def get(self, key):
+        tile = self._tiles.get(key)
+        if tile is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._tiles.move_to_end(key)
+        return tile
+
+    def put(self, key, tile):
+        self._tiles[key] = tile
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+
+    def clear(self):
+        self._tiles.clear()
+
+
+DEFAULT_CACHE = TileCache()
+
+
+@dataclasses.dataclass
+class PotentialSurface:
+    potential: Any
+    tile_size: int = 128
+    # Grid spacing of level 0.  Level L has spacing base_spacing / 2 ** L,
+    # so every zoom by two lands on the next level's lattice.
+    base_spacing: float = 1 / 16
+    # The two coordinates plotted and, for potentials of more than two
+    # parameters, the point the plotted slice goes through
+    axes: tuple = (0, 1)
+    point: Any = None
+    cache: Any = None
+
+    example = textwrap.dedent("""
+    surface = PotentialSurface(rosenbrock)
+    Z, extent = surface.evaluate(xlim=(-5, 5), ylim=(-5, 5), resolution=1000)
+    plt.imshow(Z, extent=extent, origin='lower')
+
+    # or let plot_potential() draw it and follow zooms and pans
+    ax = plot_potential(rosenbrock, ball_generator=lambda: optimizer.result.w)
+
+    The plane is cut into a fixed lattice of tile_size x tile_size tiles
+    per level of detail.  A view is drawn from the tiles of the level
+    that gives at least resolution points across it; each tile is one
+    jit compiled, vmapped call of the potential, and evaluated tiles are
+    kept in an LRU TileCache.  Panning only evaluates the tiles that come
+    into view, zooming back reuses the coarser level, and changing the
+    colour scale evaluates nothing.  refine() goes from coarse to fine
+    levels, which plot_potential() uses to answer a zoom with a coarse
+    image first.
+    """)
+
+    def __post_init__(self):
+        if self.cache is None:
+            self.cache = DEFAULT_CACHE
+        if self.point is None:
+            self.point = jnp.zeros(max(self.axes) + 1, dtype=jnp.float32)
+        self.point = jnp.asarray(self.point, dtype=jnp.float32)
+
+    def _get_tile_fn(self):
+        key = (self.potential, self.tile_size, self.axes)
+        cached = self.__dict__.get('_tile_fn_cache')
+        if cached is None or cached[0] != key:
+            cached = self.__dict__['_tile_fn_cache'] = (key, jax.jit(self._tile))
+        return cached[1]
+
+    def _tile(self, x0, y0, spacing, point):
+        """
+        The potential at the cell centres of one tile, rows along y.
+        """
+        size = self.tile_size
+        offsets = (jnp.arange(size, dtype=jnp.float32) + .5) * spacing
+        X, Y = jnp.meshgrid(x0 + offsets, y0 + offsets)
+        w = jnp.broadcast_to(point, (size * size, point.size))
+        w = w.at[:, self.axes[0]].set(X.ravel()).at[:, self.axes[1]].set(Y.ravel())
+        return jax.vmap(self.potential)(w).reshape(size, size)
+
+    def spacing(self, level):
+        return self.base_spacing * 2. ** -level
+
+    def level_for(self, xlim, ylim, resolution):
+        """
+        The coarsest level with at least resolution points across the
+        longer side of the view.
+        """
+        spacing = max(xlim[1] - xlim[0], ylim[1] - ylim[0]) / resolution
+        return math.ceil(math.log2(self.base_spacing / spacing))
+
+    def _key_prefix(self, level):
+        return (self.potential, self.axes, tuple(np.asarray(self.point).tolist()),
+                self.tile_size, self.base_spacing, level)
+
+    def _cells(self, xlim, ylim, level):
+        """
+        Cell bounds of the view at level, and the indices of its tiles.
+        """
+        size = self.tile_size
+        spacing = self.spacing(level)
+        x0, x1 = math.floor(xlim[0] / spacing), math.ceil(xlim[1] / spacing)
+        y0, y1 = math.floor(ylim[0] / spacing), math.ceil(ylim[1] / spacing)
+        indices = [(i, j)
+                   for j in range(y0 // size, (y1 - 1) // size + 1)
+                   for i in range(x0 // size, (x1 - 1) // size + 1)]
+        return (x0, x1, y0, y1), indices
+
+    def tiles(self, level, indices):
+        """
+        Tiles (i, j) of level as numpy arrays, evaluating the missing ones.
+        All missing tiles are dispatched before any is copied back, so the
+        device works through them back to back.
+        """
+        size = self.tile_size
+        spacing = self.spacing(level)
+        tile_fn = self._get_tile_fn()
+        prefix = self._key_prefix(level)
+        out = {}
+        pending = {}
+        for i, j in indices:
+            key = prefix + (i, j)
+            tile = self.cache.get(key)
+            if tile is None:
+                pending[(i, j)] = (key, tile_fn(i * size * spacing, j * size * spacing,
+                                                spacing, self.point))
+            else:
+                out[(i, j)] = tile
+        for index, (key, tile) in pending.items():
+            tile = out[index] = np.asarray(tile)
+            self.cache.put(key, tile)
+        return out
+
+    def evaluate(self, xlim, ylim, resolution=1000, level=None):
+        """
+        The surface over the view, as (Z, extent) for imshow with
+        origin='lower'.  extent is the view rounded out to whole cells of
+        the level (default level_for(xlim, ylim, resolution)).
+        """
+        if level is None:
+            level = self.level_for(xlim, ylim, resolution)
+        size = self.tile_size
+        spacing = self.spacing(level)
+        (x0, x1, y0, y1), indices = self._cells(xlim, ylim, level)
+        tiles = self.tiles(level, indices)
+
+        Z = np.empty((y1 - y0, x1 - x0), dtype=np.float32)
+        for (i, j), tile in tiles.items():
+            # Overlap of the tile and the view, in cells
+            cx0, cx1 = max(i * size, x0), min((i + 1) * size, x1)
+            cy0, cy1 = max(j * size, y0), min((j + 1) * size, y1)
+            Z[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = tile[
+                cy0 - j * size:cy1 - j * size, cx0 - i * size:cx1 - i * size]
+        return Z, (x0 * spacing, x1 * spacing, y0 * spacing, y1 * spacing)
+
+    def refine(self, xlim, ylim, resolution=1000, steps=3):
+        """
+        Yield (Z, extent) of the view from resolution / 2 ** steps points
+        across up to resolution.  A view whose final level is already
+        cached goes straight to it.
+        """
+        final = self.level_for(xlim, ylim, resolution)
+        prefix = self._key_prefix(final)
+        _, indices = self._cells(xlim, ylim, final)
+        if all(prefix + index in self.cache for index in indices):
+            steps = 0
+        for level in range(final - steps, final + 1):
+            yield self.evaluate(xlim, ylim, level=level)
+
+    def follow(self, ax, image, transform=None, resolution=1000, steps=3):
+        """
+        Keep image (an AxesImage of this surface) matching the view of ax.
+        After a zoom or pan each draw shows the next finer level, starting
+        resolution / 2 ** steps points across, so the canvas answers at
+        once and the detail fills in over the following draws.  transform
+        maps potential values to image values (e.g. to dB).  image is
+        taken to already show the current view.
+        """
+        state = {'view': (tuple(ax.get_xlim()), tuple(ax.get_ylim())), 'levels': iter(())}
+
+        def on_draw(event):
+            view = (tuple(ax.get_xlim()), tuple(ax.get_ylim()))
+            if view != state['view']:
+                state['view'] = view
+                state['levels'] = self.refine(*view, resolution=resolution, steps=steps)
+            Z, extent = next(state['levels'], (None, None))
+            if Z is None:
+                return
+            image.set_data(Z if transform is None else transform(Z))
+            image.set_extent(extent)
+            # set_extent may autoscale the limits, which must stay the user's
+            ax.set_xlim(view[0])
+            ax.set_ylim(view[1])
+            ax.figure.canvas.draw_idle()
+
+        return ax.figure.canvas.mpl_connect('draw_event', on_draw)
+
+
+def plot_potential(potential, xlim=(-5, 5), ylim=(-5, 5), clim=(0, 45), db=True,
+                   ball_generator=None, resolution=1000, surface=None, follow=True):
+    """
+    Image of the potential over xlim x ylim, optionally with the balls of
+    ball_generator() on top.  With follow the image is re-evaluated when
+    the axes are zoomed or panned.
+    """
+    from matplotlib import pyplot as plt
+
+    if surface is None:
+        surface = PotentialSurface(potential)
+
+    def transform(Z):
+        return 10 * np.log10(1 + Z) if db else Z
+
+    Z, extent = surface.evaluate(xlim, ylim, resolution)
+    fig = plt.figure(figsize=(8, 6))
+    image = plt.imshow(transform(Z), extent=extent, origin='lower', cmap='nipy_spectral')
+    plt.colorbar(label='potential (dB)' if db else 'potential')
+    plt.clim(*clim)
+    plt.title(f'{getattr(potential, "__name__", "potential")}')
+    plt.xlabel('x')
+    plt.ylabel('y')
+    ax = fig.axes[0]
+    if ball_generator is not None:
+        W = np.asarray(ball_generator())
+        ax.plot(W[:, surface.axes[0]], W[:, surface.axes[1]], '.', color='black')
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    if follow:
+        surface.follow(ax, image, transform, resolution)
+    return ax
@@ -0,0 +1,830 @@
+import collections
+import dataclasses
+import queue
+import sys
+import textwrap
+import threading
+from typing import Any
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import optax
+from jax import lax
+
+
+def pad_batch(target, kwargs, batch_size):
+    """
+    Pad one batch to batch_size samples.  Returns (target, weights, kwargs)
+    with weights 1 for real samples and 0 for the padding, so every batch
+    has the same shape and hits the same compiled step.  kwargs with the
+    length of target are padded, the others are passed through.
+    """
+    target = np.asarray(target)
+    n = len(target)
+    pad = batch_size - n
+    weights = np.ones(batch_size, dtype=np.float32)
+    if pad:
+        weights[n:] = 0
+        target = np.pad(target, [(0, pad)] + [(0, 0)] * (target.ndim - 1), mode='edge')
+    padded = {}
+    for k, v in kwargs.items():
+        if np.ndim(v) and len(v) == n:
+            v = np.asarray(v)
+            if pad:
+                v = np.pad(v, [(0, pad)] + [(0, 0)] * (v.ndim - 1), mode='edge')
+        padded[k] = v
+    return target, weights, padded
+
+
+def pad_batches(batches, batch_size):
+    """
+    Fixed size batches from an iterable of (target, kwargs) pairs of any
+    length.  Larger ones are split, shorter ones padded.
+    """
+    for target, kwargs in batches:
+        n = len(target)
+        sliced = [k for k, v in kwargs.items() if np.ndim(v) and len(v) == n]
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            part = dict(kwargs)
+            for k in sliced:
+                part[k] = kwargs[k][start:stop]
+            yield pad_batch(target[start:stop], part, batch_size)
+
+
+class BatchLoader:
+    """
+    Mini-batches of contiguous samples from arrays that need not fit on
+    the device, e.g. np.load(path, mmap_mode='r').  kwargs with the length
+    of target are sliced along with it, the others are passed to every
+    batch.  Only the batch order is shuffled, so memory mapped reads stay
+    sequential.
+    """
+
+    def __init__(self, target, batch_size=65536, shuffle=True, seed=0, **kwargs):
+        self.target = target
+        self.kwargs = kwargs
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        n = len(target)
+        self.sliced = [k for k, v in kwargs.items() if np.ndim(v) and len(v) == n]
+
+    def __len__(self):
+        return -(-len(self.target) // self.batch_size)
+
+    def __iter__(self):
+        return self.batches()
+
+    def batches(self, shuffle=None):
+        order = np.arange(len(self))
+        if self.shuffle if shuffle is None else shuffle:
+            self.rng.shuffle(order)
+        for index in order:
+            start = index * self.batch_size
+            stop = min(start + self.batch_size, len(self.target))
+            kwargs = dict(self.kwargs)
+            for k in self.sliced:
+                kwargs[k] = self.kwargs[k][start:stop]
+            yield pad_batch(self.target[start:stop], kwargs, self.batch_size)
+
+
+def prefetch_to_device(batches, size=2):
+    """
+    Iterate over batches while a background thread reads up to size of
+    them ahead and copies them to the device, so host reads and transfers
+    overlap the optimizer steps.  Errors in the reader are raised here.
+    """
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+    errors = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(jax.device_put(batch)):
+                    return
+        except BaseException as error:
+            errors.append(error)
+        put(end)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is end:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        thread.join()
+
+
+class MetricsChannel:
+    """
+    Deliver fit snapshots to a callback on a background thread.
+
+    push() never waits for the callback.  Snapshots wait in a queue of at
+    most maxsize (at least 1), and when it is full the policy decides: 'coalesce'
+    replaces the newest waiting snapshot with the new one, 'drop' discards
+    the new one.  convert runs on the thread too, so device to host copies
+    and model evaluations for plotting stay out of the fit loop.  An error
+    in the callback is raised from the next push() or from close().
+
+    With threaded=False push() simply calls the callback.
+    """
+
+    def __init__(self, callback, convert=None, maxsize=2, policy='coalesce', threaded=True):
+        if policy not in ('coalesce', 'drop'):
+            raise ValueError(f'Unknown policy {policy!r}')
+        if maxsize < 1:
+            # coalesce needs a waiting snapshot to replace
+            raise ValueError(f'maxsize must be at least 1, got {maxsize}')
+        self.callback = callback
+        self.convert = convert or (lambda snapshot: snapshot)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.threaded = threaded
+        self.pushed = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.error = None
+        self._raised = False
+        self._pending = collections.deque()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def push(self, snapshot, keep=False):
+        """
+        Queue snapshot for the callback.  keep=True snapshots (e.g. the
+        final state) are never coalesced or dropped.
+        """
+        self._raise_error()
+        self.pushed += 1
+        if not self.threaded:
+            self.callback(self.convert(snapshot))
+            self.delivered += 1
+            return
+        with self._ready:
+            if len(self._pending) < self.maxsize or keep:
+                self._pending.append(snapshot)
+            elif self.policy == 'coalesce':
+                self._pending[-1] = snapshot
+                self.coalesced += 1
+            else:
+                self.dropped += 1
+            self._ready.notify()
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._pending and not self._closed:
+                    self._ready.wait()
+                if not self._pending:
+                    return
+                snapshot = self._pending.popleft()
+            if self.error is not None:
+                continue
+            try:
+                self.callback(self.convert(snapshot))
+                self.delivered += 1
+            except BaseException as error:
+                self.error = error
+
+    def _raise_error(self):
+        if self.error is not None and not self._raised:
+            self._raised = True
+            raise self.error
+
+    def close(self):
+        """
+        Deliver what is still queued, stop the thread and raise any
+        callback error.
+        """
+        if self._thread is not None:
+            with self._ready:
+                self._closed = True
+                self._ready.notify()
+            self._thread.join()
+        self._raise_error()
+
+    def stats(self):
+        return {
+            'pushed': self.pushed,
+            'delivered': self.delivered,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+        }
+
+
+@dataclasses.dataclass
+class JaxMLE:
+    model: Any
+    learning_rate: float = .1
+    callback: Any = None
+    callback_every: int = 1
+    kwarg_to_track: Any = None
+    w: Any = dataclasses.field(init=False)
+    cov: Any = dataclasses.field(init=False)
+    sigma: Any = dataclasses.field(init=False)
+    N: Any = dataclasses.field(init=False)
+    result: Any = dataclasses.field(init=False)
+    best_state: Any = dataclasses.field(init=False)
+    max_iter: int = 500
+    max_iter_after_best: int = 100
+    # Any optax GradientTransformation.  Defaults to adam(learning_rate)
+    optimizer: Any = None
+    # Steps run on device between host syncs when there is no callback
+    chunk_size: int = 1000
+    # 'gauss_newton' (2 J^T J of the model) or 'hessian' (exact loss hessian)
+    covariance_method: str = 'gauss_newton'
+    # Curvature columns evaluated together when building the covariance
+    curvature_batch_size: int = 16
+    # Prediction grid points per jacobian evaluation in predict_and_error
+    error_chunk_size: int = 16384
+    # Samples per step in fit_stream(), for data that is not a BatchLoader
+    batch_size: int = 65536
+    # Batches read and copied to the device ahead of the step in fit_stream()
+    prefetch: int = 2
+    # Run the callback on a MetricsChannel thread instead of in the fit loop
+    async_callback: bool = True
+    # Snapshots waiting for a slow callback, and 'coalesce' or 'drop' beyond
+    callback_queue_size: int = 2
+    callback_policy: str = 'coalesce'
+
+    @dataclasses.dataclass
+    class IterationState:
+        iterations: Any = None
+        losses: Any = None
+        best_iterations: Any = None
+        best_losses: Any = None
+        params: Any = None
+        kwargs: Any = None
+        y: Any = None
+        yhat: Any = None
+
+    @dataclasses.dataclass
+    class BatchResult:
+        # Stacked over the batch: params (B, P), cov (B, P, P), the rest (B,)
+        params: Any = None
+        losses: Any = None
+        best_iterations: Any = None
+        iterations: Any = None
+        cov: Any = None
+        sigma: Any = None
+        # (B, steps) loss per step, nan once a fit has stopped
+        loss_history: Any = None
+
+    example = textwrap.dedent("""
+    def model(w, t):
+        a, f, t0, gamma = w
+        return a * jnp.sin(2 * np.pi * f * (t - t0)) * jnp.exp(gamma * t)
+
+    fitter = JaxMLE(model, learning_rate=.09, max_iter=18270, callback=call_back, callback_every=100)
+    fitter.fit(w0, y, t=t)
+    yf, sigma = fitter.predict_and_error(t=t)
+
+    The optimizer runs on device in jit compiled chunks of callback_every
+    steps (chunk_size without a callback).  The host only sees the state at
+    chunk boundaries, which is when the callback gets an IterationState of
+    numpy arrays.  The callback runs on a background thread (a
+    MetricsChannel), so a slow plot never holds up the optimizer: while it
+    is busy, newer snapshots replace waiting ones (callback_policy
+    'coalesce') or are skipped ('drop').  The loss history is never lost
+    either way, and the final best state is always delivered before fit()
+    returns.  fitter.callback_stats counts what was coalesced or dropped.
+    async_callback=False calls it in the loop instead.
+
+    fit_batch() runs many independent fits at once, vmapping the whole
+    optimizer over a batch of starting points and/or targets:
+
+    # 64 random restarts against one data set
+    w0s = w0 * np.random.uniform(.5, 1.5, size=(64, 4))
+    result = fitter.fit_batch(w0s, y, t=t)
+    w_best = result.params[np.argmin(result.losses)]
+
+    # one fit per row of targets, all starting from w0
+    result = fitter.fit_batch(w0, targets, t=t)
+
+    fit_stream() fits data too large for the device in mini-batches, with
+    any optax optimizer (stochastic ones like sgd or adam with a schedule
+    suit it best).  Batches are prefetched to the device on a background
+    thread, and the covariance is accumulated in a second pass over the
+    batches at the best parameters:
+
+    y = np.load('y.npy', mmap_mode='r')
+    t = np.load('t.npy', mmap_mode='r')
+    fitter = JaxMLE(model, optimizer=optax.adam(1e-2), callback=call_back, callback_every=100)
+    fitter.fit_stream(w0, BatchLoader(y, batch_size=2 ** 16, t=t), num_epochs=3)
+
+    data can also be a callable returning a fresh iterator of
+    (target, kwargs) pairs for every pass.
+    """)
+
+    def _loss(self, w, target, **kwargs):
+        y = self.model(w, **kwargs)
+        if y.shape != target.shape:
+            raise ValueError('The shape of the target variable must match model output shape')
+        return jnp.sum((y - target) ** 2)
+
+    def _batch_loss(self, w, target, weights, kwargs):
+        """
+        Mean squared residual over the real (weight 1) samples of a batch,
+        so steps do not scale with the batch size.
+        """
+        y = self.model(w, **kwargs)
+        if y.shape != target.shape:
+            raise ValueError('The shape of the target variable must match model output shape')
+        return jnp.sum(weights * (y - target) ** 2) / jnp.sum(weights)
+
+    def _get_optimizer(self):
+        if self.optimizer is not None:
+            return self.optimizer
+        return optax.adam(self.learning_rate)
+
+    def _open_channel(self, convert):
+        if self.callback is None:
+            return None
+        return MetricsChannel(
+            self.callback,
+            convert,
+            maxsize=self.callback_queue_size,
+            policy=self.callback_policy,
+            threaded=self.async_callback,
+        )
+
+    def _close_channel(self, channel):
+        if channel is not None:
+            self.callback_stats = channel.stats()
+            channel.close()
+            self.callback_stats = channel.stats()
+
+    def _cached(self, key, build):
+        """
+        Compiled functions, cached so that refits and repeated predictions
+        with the same model and settings skip compilation.  jit itself
+        caches per argument shape.
+        """
+        key = (self.model, self.optimizer, self.learning_rate, self.covariance_method,
+               self.curvature_batch_size) + key
+        cache = self.__dict__.setdefault('_jit_cache', {})
+        if key not in cache:
+            cache[key] = build()
+        return cache[key]
+
+    def _get_run_chunk(self, in_axes=None):
+        """
+        The jitted chunk runner.  With in_axes (carry axis, target axis) it
+        is vmapped for fit_batch().
+        """
+        def build():
+            run_chunk = self._make_run_chunk(self._get_optimizer())
+            if in_axes is not None:
+                run_chunk = self._batched(run_chunk, in_axes)
+            return jax.jit(run_chunk, static_argnums=5)
+        return self._cached(('run_chunk', in_axes), build)
+
+    @staticmethod
+    def _batched(run_chunk, in_axes):
+        def batched_run_chunk(carry, target, kwargs, num_steps, patience, length):
+            def run_one(carry, target):
+                return run_chunk(carry, target, kwargs, num_steps, patience, length)
+            return jax.vmap(run_one, in_axes=in_axes)(carry, target)
+        return batched_run_chunk
+
+    def _make_run_chunk(self, optimizer):
+        loss_and_grad = jax.value_and_grad(self._loss)
+
+        def run_chunk(carry, target, kwargs, num_steps, patience, length):
+            """
+            Run up to num_steps (<= length) optimizer steps in a while_loop,
+            stopping early once patience steps pass without a new best.
+            Returns the new carry and the losses of the steps taken
+            (nan padded to length).
+            """
+            def cond(state):
+                ii, _, carry = state
+                done = carry[-1]
+                return (ii < num_steps) & ~done
+
+            def body(state):
+                ii, losses, (w, opt_state, nn, best_w, best_loss, best_iter, done) = state
+                loss, grads = loss_and_grad(w, target, **kwargs)
+                improved = loss < best_loss
+                best_w = jnp.where(improved, w, best_w)
+                best_loss = jnp.where(improved, loss, best_loss)
+                best_iter = jnp.where(improved, nn, best_iter)
+                done = nn - best_iter > patience
+                updates, opt_state = optimizer.update(grads, opt_state, w)
+                w = optax.apply_updates(w, updates)
+                losses = losses.at[ii].set(loss)
+                carry = (w, opt_state, nn + 1, best_w, best_loss, best_iter, done)
+                return ii + 1, losses, carry
+
+            losses = jnp.full(length, jnp.nan, dtype=jnp.float32)
+            _, losses, carry = lax.while_loop(cond, body, (0, losses, carry))
+            return carry, losses
+
+        return run_chunk
+
+    def fit(self, w0, target, **kwargs):
+        w = jnp.array(w0).astype(jnp.float32)
+        target = jnp.array(target)
+        kwargs = {k: jnp.asarray(v) for k, v in kwargs.items()}
+
+        optimizer = self._get_optimizer()
+        run_chunk = self._get_run_chunk()
+        length = self.callback_every if self.callback is not None else self.chunk_size
+        length = max(1, min(length, self.max_iter))
+
+        carry = (
+            w,
+            optimizer.init(w),
+            jnp.array(0),
+            w,
+            jnp.array(jnp.inf, dtype=jnp.float32),
+            jnp.array(0),
+            jnp.array(False),
+        )
+        loss_chunks = []
+        self.best_iterations = []
+        self.best_losses = []
+        best_loss = np.inf
+        steps = 0
+        done = False
+
+        def convert(snapshot):
+            if isinstance(snapshot, self.IterationState):
+                return snapshot
+            # loss_chunks only grows, so its first num_chunks never change
+            w, num_chunks = snapshot
+            chunks = loss_chunks[:num_chunks]
+            return self._iteration_state(w, chunks, target, kwargs, sum(map(len, chunks)))
+
+        channel = self._open_channel(convert)
+        try:
+            try:
+                while steps < self.max_iter and not done:
+                    num_steps = min(length, self.max_iter - steps)
+                    carry, losses = run_chunk(
+                        carry, target, kwargs, num_steps, self.max_iter_after_best, length)
+                    # The one host sync per chunk
+                    nn, done = int(carry[2]), bool(carry[-1])
+                    losses = np.asarray(losses[:nn - steps])
+                    best_loss = self._record_bests(losses, steps, best_loss)
+                    loss_chunks.append(losses)
+                    steps = nn
+                    if channel is not None and not done:
+                        channel.push((carry[0], len(loss_chunks)))
+
+            except KeyboardInterrupt:
+                print('Keyboard interrupt. Retaining current and best state.', file=sys.stderr)
+
+            best_w, best_iter = carry[3], int(carry[5])
+            losses = np.concatenate(loss_chunks) if loss_chunks else np.zeros(0, dtype=np.float32)
+            self.best_state = self._iteration_state(
+                best_w, [losses[:best_iter + 1]], target, kwargs, best_iter + 1)
+            if channel is not None:
+                channel.push(self.best_state, keep=True)
+        finally:
+            self._close_channel(channel)
+
+        self.w = best_w
+        self.N = len(target)
+        covariance = self._cached(('covariance',), lambda: jax.jit(self._covariance))
+        self.cov = covariance(self.w, target, kwargs)
+        self.sigma = jnp.sqrt(jnp.diag(self.cov).squeeze())
+        self._cov_factor = None
+
+    def _information_matrix(self, w, target, kwargs, weights=None):
+        """
+        Curvature of the loss at w, built column by column from
+        jacobian- or hessian-vector products, so memory stays at
+        O(N * curvature_batch_size + P**2) instead of a dense N x P
+        jacobian.  weights masks the padding of a fit_stream() batch.
+        """
+        basis = jnp.eye(w.size, dtype=w.dtype)
+        if self.covariance_method == 'hessian':
+            if weights is None:
+                loss_grad = jax.grad(lambda w: self._loss(w, target, **kwargs))
+            else:
+                loss_grad = jax.grad(
+                    lambda w: jnp.sum(weights * (self.model(w, **kwargs) - target) ** 2))
+
+            def column(v):
+                return jax.jvp(loss_grad, (w,), (v,))[1]
+        elif self.covariance_method == 'gauss_newton':
+            _, model_jvp = jax.linearize(lambda w: self.model(w, **kwargs), w)
+            model_vjp = jax.linear_transpose(model_jvp, w)
+
+            def column(v):
+                spread = model_jvp(v)
+                if weights is not None:
+                    spread = weights * spread
+                return 2 * model_vjp(spread)[0]
+        else:
+            raise ValueError(f'Unknown covariance_method {self.covariance_method!r}')
+        return lax.map(column, basis, batch_size=self.curvature_batch_size)
+
+    @staticmethod
+    def _scaled_inverse(information_matrix, variance):
+        factor = jax.scipy.linalg.cho_factor(information_matrix)
+        identity = jnp.eye(information_matrix.shape[0], dtype=information_matrix.dtype)
+        return variance * jax.scipy.linalg.cho_solve(factor, identity)
+
+    def _covariance(self, w, target, kwargs):
+        information_matrix = self._information_matrix(w, target, kwargs)
+        sigma = jnp.std(target - self.model(w, **kwargs))
+        return self._scaled_inverse(information_matrix, sigma ** 2)
+
+    def _accumulate_statistics(self, stats, w, target, weights, kwargs):
+        """
+        Add one batch to the streaming covariance statistics: the summed
+        curvature, and count / mean / sum of squared deviations of the
+        residuals, merged with Chan's parallel update so float32 holds up
+        over 1e8 samples.
+        """
+        information_matrix, count, mean, m2 = stats
+        residual = target - self.model(w, **kwargs)
+        batch_count = jnp.sum(weights)
+        batch_mean = jnp.sum(weights * residual) / batch_count
+        batch_m2 = jnp.sum(weights * (residual - batch_mean) ** 2)
+        previous = count.astype(mean.dtype)
+        total = previous + batch_count
+        delta = batch_mean - mean
+        mean = mean + delta * batch_count / total
+        m2 = m2 + batch_m2 + delta ** 2 * previous * batch_count / total
+        information_matrix = information_matrix + self._information_matrix(
+            w, target, kwargs, weights)
+        return information_matrix, count + batch_count.astype(count.dtype), mean, m2
+
+    def _make_stream_step(self, optimizer):
+        loss_and_grad = jax.value_and_grad(self._batch_loss)
+
+        def step(w, opt_state, target, weights, kwargs):
+            loss, grads = loss_and_grad(w, target, weights, kwargs)
+            updates, opt_state = optimizer.update(grads, opt_state, w)
+            return optax.apply_updates(w, updates), opt_state, loss
+
+        return step
+
+    def _stream_batches(self, data, shuffle=True):
+        if isinstance(data, BatchLoader):
+            return data.batches(None if shuffle else False)
+        return pad_batches(data() if callable(data) else data, self.batch_size)
+
+    def fit_stream(self, w0, data, num_epochs=1):
+        """
+        Fit in mini-batches.  data is a BatchLoader, or a re-iterable (or a
+        callable returning a fresh iterator) of (target, kwargs) pairs that
+        are cut or padded to batch_size.  Each step is one optimizer update
+        on the mean squared residual of one batch, and the host syncs only
+        once per epoch.  Every callback_every steps the callback gets the
+        current batch as kwargs, y and yhat, through the same channel as
+        in fit().
+
+        self.w is the parameters at the end of the epoch with the lowest
+        mean batch loss.  The covariance comes from a second pass over the
+        data at self.w that sums the curvature batch by batch, so it
+        matches fit() on the same data without holding it all at once.
+        """
+        if not (isinstance(data, BatchLoader) or callable(data)) and iter(data) is data:
+            raise ValueError(
+                'data is read more than once, pass a BatchLoader, a re-iterable '
+                'or a callable returning an iterator')
+        w = jnp.array(w0).astype(jnp.float32)
+        optimizer = self._get_optimizer()
+        step = self._cached(
+            ('stream_step',), lambda: jax.jit(self._make_stream_step(optimizer)))
+        opt_state = optimizer.init(w)
+
+        self.best_iterations = []
+        self.best_losses = []
+        self.epoch_losses = []
+        loss_chunks = []
+        best_w = w
+        best_loss = np.inf
+        steps = 0
+        batch = None
+
+        def convert(snapshot):
+            if isinstance(snapshot, self.IterationState):
+                return snapshot
+            # The device losses of the current epoch are synced here, off
+            # the fit loop
+            w, num_chunks, epoch_losses, batch = snapshot
+            chunks = loss_chunks[:num_chunks] + [np.asarray(jnp.stack(epoch_losses))]
+            return self._stream_state(w, chunks, batch)
+
+        channel = self._open_channel(convert)
+        try:
+            try:
+                for _ in range(num_epochs):
+                    epoch_losses = []
+                    for batch in prefetch_to_device(self._stream_batches(data), self.prefetch):
+                        w, opt_state, loss = step(w, opt_state, *batch)
+                        epoch_losses.append(loss)
+                        steps += 1
+                        if channel is not None and steps % self.callback_every == 0:
+                            channel.push((w, len(loss_chunks), list(epoch_losses), batch))
+                    # The one host sync per epoch
+                    losses = np.asarray(jnp.stack(epoch_losses))
+                    loss_chunks.append(losses)
+                    epoch_loss = float(losses.mean())
+                    self.epoch_losses.append(epoch_loss)
+                    if epoch_loss < best_loss:
+                        best_w, best_loss = w, epoch_loss
+                        self.best_iterations.append(steps - 1)
+                        self.best_losses.append(epoch_loss)
+
+            except KeyboardInterrupt:
+                print('Keyboard interrupt. Retaining current and best state.', file=sys.stderr)
+
+            self.w = best_w
+            if batch is not None:
+                self.best_state = self._stream_state(best_w, loss_chunks or [np.zeros(0)], batch)
+                if channel is not None:
+                    channel.push(self.best_state, keep=True)
+        finally:
+            self._close_channel(channel)
+
+        accumulate = self._cached(
+            ('stream_statistics',), lambda: jax.jit(self._accumulate_statistics))
+        stats = (
+            jnp.zeros((w.size, w.size), dtype=w.dtype),
+            jnp.array(0, dtype=jnp.int32),
+            jnp.array(0., dtype=w.dtype),
+            jnp.array(0., dtype=w.dtype),
+        )
+        for batch in prefetch_to_device(self._stream_batches(data, shuffle=False), self.prefetch):
+            stats = accumulate(stats, self.w, *batch)
+        information_matrix, count, _, m2 = stats
+        self.N = int(count)
+        self.cov = self._scaled_inverse(information_matrix, m2 / count)
+        self.sigma = jnp.sqrt(jnp.diag(self.cov).squeeze())
+        self._cov_factor = None
+
+    def _stream_state(self, w, loss_chunks, batch):
+        """
+        IterationState for fit_stream(), with the real samples of batch as
+        the data.
+        """
+        target, weights, kwargs = batch
+        n = int(jnp.sum(weights))
+        kwargs = {k: v[:n] if np.ndim(v) and len(v) == len(target) else v
+                  for k, v in kwargs.items()}
+        return self._iteration_state(
+            w, loss_chunks, target[:n], kwargs, sum(map(len, loss_chunks)))
+
+    def fit_batch(self, w0, target, **kwargs):
+        """
+        Run independent fits for a batch of starting points (w0 of shape
+        (B, P)) and/or targets (target with a leading batch axis B), with
+        kwargs shared by all of them.  An unbatched w0 or target is used
+        for every fit.  Each fit stops on its own max_iter_after_best, and
+        results come back stacked in a BatchResult, which is also stored
+        in self.result.
+        """
+        w0 = jnp.array(w0).astype(jnp.float32)
+        target = jnp.array(target)
+        kwargs = {k: jnp.asarray(v) for k, v in kwargs.items()}
+
+        output_shape = jax.eval_shape(self.model, w0.reshape(-1, w0.shape[-1])[0], **kwargs).shape
+        target_axis = 0 if target.ndim == len(output_shape) + 1 else None
+        batch_size = max(w0.shape[0] if w0.ndim == 2 else 1,
+                         target.shape[0] if target_axis == 0 else 1)
+        w = jnp.broadcast_to(w0, (batch_size, w0.shape[-1]))
+
+        optimizer = self._get_optimizer()
+        run_chunk = self._get_run_chunk((0, target_axis))
+        length = max(1, min(self.chunk_size, self.max_iter))
+
+        carry = (
+            w,
+            jax.vmap(optimizer.init)(w),
+            jnp.zeros(batch_size, dtype=jnp.int32),
+            w,
+            jnp.full(batch_size, jnp.inf, dtype=jnp.float32),
+            jnp.zeros(batch_size, dtype=jnp.int32),
+            jnp.zeros(batch_size, dtype=bool),
+        )
+        loss_chunks = []
+        steps = 0
+        while steps < self.max_iter:
+            num_steps = min(length, self.max_iter - steps)
+            carry, losses = run_chunk(
+                carry, target, kwargs, num_steps, self.max_iter_after_best, length)
+            iterations, done = np.asarray(carry[2]), np.asarray(carry[-1])
+            loss_chunks.append(np.asarray(losses)[:, :iterations.max() - steps])
+            steps = int(iterations.max())
+            if done.all():
+                break
+
+        covariance = self._cached(
+            ('batch_covariance', target_axis),
+            lambda: jax.jit(jax.vmap(self._covariance, in_axes=(0, target_axis, None))))
+        cov = covariance(carry[3], target, kwargs)
+        self.result = self.BatchResult(
+            params=carry[3],
+            losses=carry[4],
+            best_iterations=carry[5],
+            iterations=carry[2],
+            cov=cov,
+            sigma=jnp.sqrt(jnp.diagonal(cov, axis1=1, axis2=2)),
+            loss_history=np.concatenate(loss_chunks, axis=1),
+        )
+        return self.result
+
+    def _record_bests(self, losses, start, best_loss):
+        """
+        Append the iterations of losses (starting at iteration start) that
+        set a new best to best_iterations / best_losses.
+        """
+        previous_best = np.minimum.accumulate(np.concatenate([[best_loss], losses]))[:-1]
+        for index in np.flatnonzero(losses < previous_best):
+            self.best_iterations.append(start + int(index))
+            self.best_losses.append(float(losses[index]))
+        return min(best_loss, float(losses.min())) if len(losses) else best_loss
+
+    def _iteration_state(self, w, loss_chunks, target, kwargs, limit=None):
+        losses = np.concatenate(loss_chunks)
+        best_iterations = [nn for nn in self.best_iterations if limit is None or nn < limit]
+        return self.IterationState(
+            iterations=np.arange(len(losses)),
+            losses=losses,
+            best_iterations=best_iterations,
+            best_losses=self.best_losses[:len(best_iterations)],
+            params=np.asarray(w),
+            kwargs=kwargs,
+            y=target,
+            yhat=np.asarray(self.model(w, **kwargs)),
+        )
+
+    def _error_chunk(self, w, cov_factor, kwargs):
+        """
+        Model values and their standard errors sqrt(diag(J cov J^T)), with
+        J cov J^T = (J L)(J L)^T for cov = L L^T, pushed forward one column
+        of L at a time.
+        """
+        y, model_jvp = jax.linearize(lambda w: self.model(w, **kwargs), w)
+        spread = jax.vmap(model_jvp)(cov_factor.T)
+        return y, jnp.sqrt(jnp.sum(spread ** 2, axis=0))
+
+    def _compute_error(self, **kwargs):
+        return self.predict_and_error(**kwargs)[1]
+
+    def predict(self, **kwargs):
+        return self.model(self.w, **kwargs)
+
+    def predict_and_error(self, **kwargs):
+        """
+        Model values and standard errors on a grid.  Long grids are
+        evaluated in chunks of error_chunk_size points; this assumes the
+        model is pointwise along the first axis of every kwarg with the
+        same length as its output (e.g. t), and slices those kwargs.
+        """
+        if getattr(self, '_cov_factor', None) is None:
+            eigenvalues, eigenvectors = jnp.linalg.eigh(self.cov)
+            self._cov_factor = eigenvectors * jnp.sqrt(jnp.clip(eigenvalues, 0))
+        error_chunk = self._cached(('error_chunk',), lambda: jax.jit(self._error_chunk))
+
+        kwargs = {k: jnp.asarray(v) for k, v in kwargs.items()}
+        output_shape = jax.eval_shape(self.model, self.w, **kwargs).shape
+        n = output_shape[0] if output_shape else 0
+        chunk = self.error_chunk_size
+        sliced = [k for k, v in kwargs.items() if v.ndim and v.shape[0] == n]
+        if n <= chunk or not sliced:
+            return error_chunk(self.w, self._cov_factor, kwargs)
+
+        ys, sigmas = [], []
+        for start in range(0, n, chunk):
+            stop = min(start + chunk, n)
+            chunk_kwargs = dict(kwargs)
+            for k in sliced:
+                part = kwargs[k][start:stop]
+                # Pad the last chunk so every call hits the same compiled shape
+                pad = [(0, chunk - (stop - start))] + [(0, 0)] * (part.ndim - 1)
+                chunk_kwargs[k] = jnp.pad(part, pad, mode='edge')
+            y, sigma = error_chunk(self.w, self._cov_factor, chunk_kwargs)
+            ys.append(y[:stop - start])
+            sigmas.append(sigma[:stop - start])
+        return jnp.concatenate(ys), jnp.concatenate(sigmas)
@@ -0,0 +1,212 @@
+import contextlib
+import textwrap
+
+import numpy as np
+
+
+class StreamPlotter:
+    """
+    Make jupyter streaming plots using matplotlib and blitting.
+
+    The axes, grids, ticks and legends are drawn once and cached as a
+    background.  A frame restores the background of each subplot that has
+    changed lines and redraws only the lines of those subplots.  Limits
+    change (and the background is redrawn) only when data leaves the
+    current view, or shrinks well inside it.
+    """
+
+    example = textwrap.dedent("""
+    # In one cell (with %matplotlib ipympl)
+    plotter = StreamPlotter(rows=2, cols=2)
+    plotter.init()
+
+    # In another cell: every update inside a frame is drawn together
+    t = np.linspace(0, 2 * np.pi, 300)
+    for t0 in t[:100]:
+        ysp = np.sin(t0 - t)
+        with plotter.frame():
+            for subplot in range(4):
+                plotter.update(t, ysp, subplot=subplot, name=f'{subplot} ysp', plotspec='b')
+                plotter.update(t, -ysp, subplot=subplot, name=f'{subplot} ysm', plotspec='r')
+
+    # Outside a frame each update() is its own frame
+    plotter.update(iterations, losses, subplot=0, name='loss', logy=True)
+    """)
+
+    def __init__(self, rows=1, cols=1, figsize=(9, 5), margin=.1, shrink_below=.25):
+        """
+        margin: fraction of the data range added on each side when the
+            limits are recomputed
+        shrink_below: limits only shrink once the data spans less than
+            this fraction of the view
+        """
+        self.rows = rows
+        self.cols = cols
+        self.figsize = figsize
+        self.margin = margin
+        self.shrink_below = shrink_below
+        self.line_dict = {}
+        self.full_draws = 0
+        self.blits = 0
+        self._extents = {}
+        self._pending = {}
+        self._in_frame = False
+        self._backgrounds = None
+
+    def init(self):
+        from matplotlib import pyplot as plt
+        self.figure, self.ax_list = plt.subplots(self.rows, self.cols, figsize=self.figsize)
+        if self.rows * self.cols == 1:
+            self.ax_list = [self.ax_list]
+        else:
+            self.ax_list = self.ax_list.flatten()
+        for ax in self.ax_list:
+            ax.grid(True)
+        self.canvas = self.figure.canvas
+        # A resize or zoom invalidates the cached backgrounds
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self._full_draw()
+
+    def _on_draw(self, event):
+        self._backgrounds = None
+
+    @contextlib.contextmanager
+    def frame(self):
+        """
+        Batch every update() in the block into one drawn frame.
+        """
+        self._in_frame = True
+        try:
+            yield self
+        finally:
+            self._in_frame = False
+            self._draw_frame()
+
+    def update(self, x, y, subplot=0, name='metric', plotspec='k-', logy=False):
+        if not (0 <= subplot < len(self.ax_list)):
+            raise ValueError(f'Must have 0 <= subplot < {len(self.ax_list)}')
+        self._pending[name] = (np.asarray(x), np.asarray(y), subplot, plotspec, logy)
+        if not self._in_frame:
+            self._draw_frame()
+
+    def track(self, x, y, name='metric', subplot=0, plotspec='k-'):
+        self.update(x, y, subplot=subplot, name=name, plotspec=plotspec)
+
+    def update_many(self, updates):
+        """
+        Draw one frame from an iterable of update() keyword dicts.
+        """
+        with self.frame():
+            for kwargs in updates:
+                self.update(**kwargs)
+
+    def _extent(self, x, y, logy):
+        """
+        Data range of the finite points (positive y on a log axis), or None
+        if there are none, e.g. a loss that diverged from the start.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        keep = np.isfinite(x) & np.isfinite(y)
+        if logy:
+            keep &= y > 0
+        if not keep.any():
+            return None
+        x, y = x[keep], y[keep]
+        return x.min(), x.max(), y.min(), y.max()
+
+    def _new_limits(self, low, high, current, log):
+        """
+        Limits for data spanning low..high, or None to keep current.  On a
+        log axis low..high must be positive; non-positive current limits
+        (e.g. from before the axis went log) count as outside the view.
+        """
+        if log:
+            current = (current[0] if current[0] > 0 else low / 10,
+                       current[1] if current[1] > 0 else high * 10)
+            low, high, current = np.log10(low), np.log10(high), np.log10(current)
+        span = high - low
+        view = current[1] - current[0]
+        inside = current[0] <= low and high <= current[1]
+        if inside and span >= self.shrink_below * view:
+            return None
+        pad = self.margin * span if span > 0 else (abs(high) * self.margin or 1.)
+        limits = (low - pad, high + pad)
+        return tuple(10 ** v for v in limits) if log else limits
+
+    def _rescale(self, ax_index):
+        """
+        Apply limits for the union of the subplot's line extents.  Returns
+        True if they changed.
+        """
+        ax = self.ax_list[ax_index]
+        extents = [e for (index, e) in self._extents.values() if index == ax_index and e is not None]
+        if not extents:
+            return False
+        extents = np.array(extents)
+        changed = False
+        xlim = self._new_limits(extents[:, 0].min(), extents[:, 1].max(), ax.get_xlim(), False)
+        if xlim is not None:
+            ax.set_xlim(xlim)
+            changed = True
+        log = ax.get_yscale() == 'log'
+        low, high = extents[:, 2].min(), extents[:, 3].max()
+        if log:
+            # Lines sharing a log axis may still hold values <= 0
+            positive = extents[:, 2:][extents[:, 2:] > 0]
+            low = max(low, positive.min()) if len(positive) else None
+        ylim = None if low is None else self._new_limits(low, high, ax.get_ylim(), log)
+        if ylim is not None:
+            ax.set_ylim(ylim)
+            changed = True
+        return changed
+
+    def _draw_frame(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        needs_full_draw = self._backgrounds is None
+        changed_axes = set()
+        for name, (x, y, subplot, plotspec, logy) in pending.items():
+            ax = self.ax_list[subplot]
+            line = self.line_dict.get(name)
+            if line is None:
+                if logy:
+                    ax.set_yscale('log')
+                line = self.line_dict[name] = ax.plot(x, y, plotspec, label=name, animated=True)[0]
+                ax.legend(loc='best')
+                needs_full_draw = True
+            else:
+                line.set_data(x, y)
+            self._extents[name] = (subplot, self._extent(x, y, logy))
+            changed_axes.add(subplot)
+        for subplot in changed_axes:
+            if self._rescale(subplot):
+                needs_full_draw = True
+
+        if needs_full_draw:
+            self._full_draw()
+        else:
+            self._blit(changed_axes)
+
+    def _full_draw(self):
+        """
+        Redraw the static artists, cache them and draw every line on top.
+        """
+        self.canvas.draw()
+        self._backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax in self.ax_list]
+        self.full_draws += 1
+        self._blit(range(len(self.ax_list)))
+
+    def _blit(self, ax_indices):
+        lines_by_axes = {}
+        for line in self.line_dict.values():
+            lines_by_axes.setdefault(line.axes, []).append(line)
+        for index in ax_indices:
+            ax = self.ax_list[index]
+            self.canvas.restore_region(self._backgrounds[index])
+            for line in lines_by_axes.get(ax, []):
+                ax.draw_artist(line)
+            self.canvas.blit(ax.bbox)
+        self.blits += 1
+        self.canvas.flush_events()
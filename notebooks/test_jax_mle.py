@@ -0,0 +1,9 @@
+import pytest
+
+from jax_mle import MetricsChannel
+
+
+def test_metrics_channel_rejects_empty_queue():
+    with pytest.raises(ValueError):
+        MetricsChannel(print, maxsize=0, threaded=False)
+
@@ -0,0 +1,67 @@
+import numpy as np
+
+from tracker import decimate_minmax
+
+
+def test_decimate_minmax_keeps_extremes():
+    x = np.arange(1000)
+    y = np.sin(x / 50.)
+    y[123] = 5
+    xd, yd = decimate_minmax(x, y, 100)
+    assert len(xd) <= 100
+    assert np.all(np.diff(xd) > 0)
+    assert yd.max() == 5
+    assert yd.min() == y.min()
+
+
+def test_decimate_minmax_all_nan_bins():
+    # A loss that diverges to NaN part way through
+    x = np.arange(1000)
+    y = np.linspace(1, 0, 1000)
+    y[600:] = np.nan
+    xd, yd = decimate_minmax(x, y, 100)
+    assert len(xd) <= 100
+    assert np.isnan(yd[xd >= 600]).all()
+    assert (xd >= 600).any()
+    assert yd[xd < 600].min() == y[599]
+
+
+def test_stream_plotter_ignores_non_finite_data():
+    import matplotlib
+    matplotlib.use('Agg')
+    from stream_plotter import StreamPlotter
+
+    plotter = StreamPlotter(rows=1, cols=2)
+    plotter.init()
+    x = np.arange(3.)
+    plotter.update(x, [np.nan, np.nan, np.nan], subplot=0, name='all nan')
+    plotter.update(x, [1., 1e30, np.inf], subplot=1, name='loss', logy=True)
+    plotter.update(np.arange(4.), [1., 1e30, np.inf, np.nan], subplot=1, name='loss', logy=True)
+    low, high = plotter.ax_list[1].get_ylim()
+    assert np.isfinite(low) and np.isfinite(high)
+    assert low <= 1 and high >= 1e30
+
+
+def test_tracker_trailing_send_runs_on_the_loop():
+    import asyncio
+    import threading
+
+    from tracker import Tracker
+
+    async def run():
+        tracker = Tracker(max_fps=20, max_points=None)
+        sends = []
+        tracker.pipe.send = lambda data: sends.append((data, threading.current_thread()))
+        tracker.update([0, 1], [0, 1])
+        # Not due yet: left to the loop, even when updated from another thread
+        worker = threading.Thread(target=tracker.update, args=([0, 1, 2], [0, 1, 4]))
+        worker.start()
+        worker.join()
+        assert len(sends) == 1
+        await asyncio.sleep(.2)
+        return sends
+
+    sends = asyncio.run(run())
+    assert len(sends) == 2
+    assert list(sends[1][0][1]) == [0, 1, 4]
+    assert sends[1][1] is threading.main_thread()
@@ -1,4 +1,40 @@
 import textwrap
+import threading
+import time
+
+import numpy as np
+
+
+def decimate_minmax(x, y, max_points):
+    """
+    Downsample (x, y) to at most max_points points, keeping the min and
+    the max of y in each of max_points // 2 equal index bins so spikes
+    survive.  Points stay in their original order.  A bin that is all NaN
+    (e.g. a diverged loss) keeps one NaN point, which shows as a gap.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    if max_points is None or n <= max_points:
+        return x, y
+    bins = max(1, max_points // 2)
+    bin_size = -(-n // bins)
+    bins = -(-n // bin_size)
+    padded = np.full(bins * bin_size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(bins, bin_size)
+    # nanargmin/nanargmax raise on all NaN rows, point those at their first
+    # sample, which is NaN
+    empty = np.isnan(padded).all(axis=1)
+    padded[empty] = 0
+    offsets = np.arange(bins) * bin_size
+    lo = offsets + np.nanargmin(padded, axis=1)
+    hi = offsets + np.nanargmax(padded, axis=1)
+    index = np.sort(np.stack([lo, hi], axis=1), axis=1).ravel()
+    # A flat bin has the same index for min and max
+    index = index[np.concatenate([[True], index[1:] != index[:-1]])]
+    return x[index], y[index]
+
 
 class Tracker:
     example = textwrap.dedent("""
@@ -53,18 +89,60 @@ class Tracker:
         tracker3.update(x, y2)
         tracker4.update(x, -y2)
         time.sleep(.01)
+    # Updates are coalesced to max_fps; the last one is sent by the
+    # kernel's IOLoop once the cell finishes, or call flush() to send
+    # it at once
+
+
+
+    # -- Append-only use case -----------------------
+    # Each update carries only the new points, which are streamed to
+    # the browser through a Buffer instead of resending the history
+
+    # In tracking notebook cell
+    tracker = Tracker(label='loss', logy=True, append=True)
+    tracker.init()
+
+    # In logging cell
+    for nn in range(10000):
+        tracker.update([nn], [1 / (nn + 1)])
     """)
 
     def __init__(
             self,
-            label='metric', ylim=None,  logy=False,  width=800, height=400):
-        from holoviews.streams import Pipe
+            label='metric', ylim=None,  logy=False,  width=800, height=400,
+            max_fps=10, max_points=2000, append=False, buffer_length=1_000_000):
+        """
+        max_fps: most frames per second sent to the browser.  Updates in
+            between are coalesced, and the last one is sent once the
+            interval has passed (or at once by flush()).
+        max_points: full-series updates longer than this are min/max
+            decimated before sending (None to send everything)
+        append: each update() carries only new points, which are streamed
+            through a Buffer keeping the last buffer_length points
+        """
+        from holoviews.streams import Buffer, Pipe
+        from tornado.ioloop import IOLoop
         import holoviews as hv
         self.label = label
         self.ylim = ylim
 
         self.logy = logy
-        self.pipe = Pipe(data=None)
+        self.min_interval = 1 / max_fps if max_fps else 0
+        self.max_points = max_points
+        self.append = append
+        self._pending = None
+        self._pending_points = []
+        self._last_sent = -float('inf')
+        self._lock = threading.Lock()
+        # The notebook kernel's loop, which also serves the plot.  Trailing
+        # sends run on it so the stream is never touched from another thread.
+        self._loop = IOLoop.current()
+        self._flush_scheduled = False
+        if append:
+            self.pipe = Buffer(np.zeros((0, 2)), length=buffer_length)
+        else:
+            self.pipe = Pipe(data=None)
         if hv.Store.current_backend == 'bokeh':
             self.dmap = hv.DynamicMap(
                 self._plotter, streams=[self.pipe]
@@ -79,6 +157,8 @@ class Tracker:
         default_val = hv.Curve(([], []))
         if data is None:
             return default_val
+        if self.append:
+            return hv.Curve(data, label=self.label)
         (x, y) = data
 
         c = hv.Curve((x, y), label=self.label)
@@ -88,5 +168,56 @@ class Tracker:
         return self.dmap
 
     def update(self, x, y):
-        self.pipe.send((x, y))
+        """
+        Queue new data (the full series, or only new points in append
+        mode) and send it if a frame is due.  Otherwise a send is
+        scheduled on the IOLoop for when the frame is due, so the last
+        update is never left behind.  The loop only runs it once it gets
+        control, e.g. after the logging cell finishes.
+        """
+        with self._lock:
+            if self.append:
+                self._pending_points.append(np.column_stack([np.ravel(x), np.ravel(y)]))
+            else:
+                self._pending = (x, y)
+            wait = self.min_interval - (time.monotonic() - self._last_sent)
+            if wait <= 0:
+                self._send()
+            elif not self._flush_scheduled:
+                self._flush_scheduled = True
+                # add_callback is the only IOLoop method safe off its thread
+                self._loop.add_callback(self._loop.call_later, wait, self._trailing_send)
+
+    def _trailing_send(self):
+        with self._lock:
+            wait = self.min_interval - (time.monotonic() - self._last_sent)
+            if wait > 0 and self._has_pending():
+                # A send in between restarted the interval
+                self._loop.call_later(wait, self._trailing_send)
+            else:
+                self._flush_scheduled = False
+                self._send()
+
+    def flush(self):
+        """
+        Send whatever is pending now, regardless of max_fps.
+        """
+        with self._lock:
+            self._send()
+
+    def _has_pending(self):
+        return bool(self._pending_points) if self.append else self._pending is not None
+
+    def _send(self):
+        if not self._has_pending():
+            return
+        if self.append:
+            points = np.concatenate(self._pending_points)
+            self._pending_points = []
+            self.pipe.send(points)
+        else:
+            x, y = self._pending
+            self._pending = None
+            self.pipe.send(decimate_minmax(x, y, self.max_points))
+        self._last_sent = time.monotonic()
 
@@ -0,0 +1,271 @@
+#! /usr/bin/env python
+"""
+Micro-benchmark of the schema based decode() against the original
+helper-per-field decoder.
+
+    python scripts/bench_decode.py [number_of_packets]
+
+Reports packets per second for each message type and for a contest-like mix
+that is mostly Decode packets, and the cold start of a decoder process.
+"""
+
+import datetime
+import struct
+import subprocess
+import sys
+import time
+
+import func_parse
+
+
+# -- Reference decoder ----------------------------------------------------
+# The original helper-per-field implementation, kept here so the benchmark
+# always has the same baseline to compare against.
+
+
+def get_int8(data, index):
+    value = struct.unpack(">b", data[index : index + 1])[0]
+    return value, index + 1
+
+
+def get_int32(data, index):
+    value = struct.unpack(">i", data[index : index + 4])[0]
+    return value, index + 4
+
+
+def get_int64(data, index):
+    value = struct.unpack(">q", data[index : index + 8])[0]
+    return value, index + 8
+
+
+def get_unsigned32(data, index):
+    value = struct.unpack(">I", data[index : index + 4])[0]
+    return value, index + 4
+
+
+def get_utf8(data, index):
+    length = struct.unpack(">i", data[index : index + 4])[0]
+    if length <= 0:
+        length = 0
+        message = ""
+    else:
+        message = data[index + 4 : index + 4 + length].decode("utf-8")
+    new_index = index + 4 + length
+    return message, new_index
+
+
+def get_bool(data, index):
+    value = struct.unpack(">?", data[index : index + 1])[0]
+    return value, index + 1
+
+
+def get_time(data, index):
+    milliseconds_since_midnight, index = get_unsigned32(data, index)
+    seconds_since_midnight = milliseconds_since_midnight / 1000.0
+    utc_time = datetime.datetime.utcnow()
+    utc_date = datetime.datetime(utc_time.year, utc_time.month, utc_time.day)
+    time = utc_date + datetime.timedelta(seconds=seconds_since_midnight)
+    return time, index
+
+
+def get_double(data, index):
+    value = struct.unpack(">d", data[index : index + 8])[0]
+    return value, index + 8
+
+
+def get_datetime_tuple(data, index):
+    date_val, index = get_int64(data, index)
+    time_val, index = get_time(data, index)
+    timespec, index = get_int8(data, index)
+    return (date_val, time_val, timespec), index
+
+
+LEGACY_GETTERS = {
+    "int8": get_int8,
+    "bool": get_bool,
+    "int32": get_int32,
+    "unsigned32": get_unsigned32,
+    "int64": get_int64,
+    "double": get_double,
+    "time": get_time,
+    "datetime": get_datetime_tuple,
+    "utf8": get_utf8,
+}
+
+
+def legacy_decode(data):
+    rec = {}
+    index = 0
+    rec["magic"], index = get_unsigned32(data, index)
+    rec["schema"], index = get_unsigned32(data, index)
+    packet_type_index, index = get_int32(data, index)
+    rec["packet_type"] = func_parse.PACKET_TYPES.get(packet_type_index, "unknown")
+    for name, field_type in func_parse.SCHEMAS.get(rec["packet_type"], []):
+        rec[name], index = LEGACY_GETTERS[field_type](data, index)
+    return rec
+
+
+# -- Sample packets -------------------------------------------------------
+
+
+def pack_packet(packet_type, values):
+    """
+    Serialize a dict of field values the way WSJT-X does.
+    """
+    return bytes(func_parse.encode(packet_type, values))
+
+
+SAMPLES = {
+    "heartbeat": pack_packet(
+        "heartbeat",
+        dict(packet_id="WSJT-X", max_schema_number=3, version="2.6.1", revision="abc"),
+    ),
+    "status": pack_packet(
+        "status",
+        dict(
+            packet_id="WSJT-X",
+            dial_frequency=14074000,
+            mode="FT8",
+            dx_call="K1ABC",
+            report="-10",
+            tx_mode="FT8",
+            tx_enabled=False,
+            transmitting=False,
+            decoding=True,
+            rx_df=1200,
+            tx_df=1500,
+            de_call="N0CALL",
+            de_grid="EM10",
+            dx_grid="FN42",
+            tx_watchdog=False,
+            sub_mode="",
+            fast_mode=False,
+            special_operation=0,
+            freq_tolerance=20,
+            tr_period=15,
+            conf_name="Default",
+            tx_message="K1ABC N0CALL EM10",
+        ),
+    ),
+    "decode": pack_packet(
+        "decode",
+        dict(
+            packet_id="WSJT-X",
+            new=True,
+            time=45_000_000,
+            snr=-12,
+            delta_time=0.2,
+            delta_frequency=1234,
+            mode="~",
+            message="CQ K1ABC FN42",
+            low_confidence=False,
+            off_air=False,
+        ),
+    ),
+    "qso": pack_packet(
+        "qso",
+        dict(
+            packet_id="WSJT-X",
+            time_tuple_off=(2460000, 45_000_000, 1),
+            dx_call="K1ABC",
+            dx_grid="FN42",
+            tx_freq=14074000,
+            mode="FT8",
+            report_sent="-10",
+            report_received="-12",
+            tx_power="100",
+            comments="",
+            name="Bob",
+            time_tuple_on=(2460000, 44_900_000, 1),
+            operator_call="N0CALL",
+            my_call="N0CALL",
+            my_grid="EM10",
+            exchange_sent="",
+            exchange_received="",
+            adif_propagation_mode="",
+        ),
+    ),
+}
+
+# One status and heartbeat per period for every ~40 decodes
+CONTEST_MIX = [SAMPLES["decode"]] * 40 + [
+    SAMPLES["status"],
+    SAMPLES["heartbeat"],
+    SAMPLES["qso"],
+]
+
+
+def packets_per_second(decoders, packets, number, rounds=10):
+    """
+    Best rate of each decoder over rounds runs of number decodes.  The
+    decoders take turns within every round, so load on a busy machine hits
+    them alike rather than deciding the comparison.
+    """
+    repeats = max(1, number // len(packets) // rounds)
+    best = [float("inf")] * len(decoders)
+    for _ in range(rounds):
+        for i, decoder in enumerate(decoders):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for packet in packets:
+                    decoder(packet)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return [repeats * len(packets) / elapsed for elapsed in best]
+
+
+def cold_start(repeats=5):
+    """
+    Best wall time of a fresh interpreter that imports func_parse and
+    decodes one packet (what every spawned ingest worker pays), next to a
+    bare interpreter.
+    """
+    script = (
+        "import func_parse; "
+        f"func_parse.decode({SAMPLES['heartbeat']!r}); "
+        "import sys; sys.exit('numpy' in sys.modules or 'pandas' in sys.modules)"
+    )
+    timings = {}
+    for name, code in (("python", "pass"), ("decode", script)):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=sys.path[0] or None)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+
+def main(number=200_000):
+    for packet_type, packet in SAMPLES.items():
+        assert legacy_decode(packet).keys() == func_parse.decode(packet).keys()
+
+    cases = [(name, [packet]) for name, packet in SAMPLES.items()]
+    cases.append(("contest_mix", CONTEST_MIX))
+
+    print(f"{'case':<12} {'legacy pps':>12} {'schema pps':>12} {'speedup':>8}")
+    for name, packets in cases:
+        legacy, schema = packets_per_second((legacy_decode, func_parse.decode), packets, number)
+        print(f"{name:<12} {legacy:>12,.0f} {schema:>12,.0f} {schema / legacy:>8.2f}")
+
+    # Filtering on one field only needs a lazy view
+    packets = [SAMPLES["decode"]]
+    eager, lazy = packets_per_second(
+        (
+            lambda p: func_parse.decode(p)["snr"] > -10,
+            lambda p: func_parse.PacketView(p).snr > -10,
+        ),
+        packets,
+        number,
+    )
+    print(f"{'snr_filter':<12} {eager:>12,.0f} {lazy:>12,.0f} {lazy / eager:>8.2f}  (decode vs PacketView)")
+
+    # check=True also fails if the import dragged in numpy or pandas
+    timings = cold_start()
+    print(
+        f"cold start: {1e3 * timings['decode']:.0f} ms to first decode "
+        f"({1e3 * timings['python']:.0f} ms bare interpreter)"
+    )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,288 @@
+#! /usr/bin/env python
+"""
+Append-only capture files for raw WSJT-X datagrams.
+
+A capture is a directory of segments.  Each segment is named after the
+receive time (ns since epoch) of its first record (plus a -N suffix if
+that name is already taken) and holds
+
+    8 byte file magic, then records of
+    8 byte receive time (ns since epoch), 4 byte length, datagram
+
+all big-endian.  Next to every segment is a sparse time index (.idx) with
+one (time ns, file offset) entry every index_every seconds, so a replay of
+a time window seeks straight to the right place instead of scanning.
+
+Replay memory-maps the segments and yields memoryviews straight out of the
+map, which func_parse.decode() reads without copying.
+
+    # record everything the listener sees
+    python scripts/capture.py record captures/
+
+    # print decoded packets between two UTC times
+    python scripts/capture.py replay captures/ --start "2024-06-30 14:00" --end "2024-06-30 14:15"
+"""
+
+import argparse
+import bisect
+import collections
+import datetime
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+FILE_MAGIC = b"WSJTXCP1"
+RECORD = struct.Struct(">qI")
+INDEX_ENTRY = struct.Struct(">qQ")
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+
+def to_ns(when):
+    """
+    Convert a datetime (naive means UTC), a "YYYY-MM-DD HH:MM[:SS]" string or
+    epoch seconds into integer ns since epoch.
+    """
+    if when is None:
+        return None
+    if isinstance(when, str):
+        when = datetime.datetime.fromisoformat(when)
+    if isinstance(when, datetime.datetime):
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        when = when.timestamp()
+    return int(round(when * 1e9))
+
+
+class CaptureWriter:
+    """
+    Append datagrams with their receive time to a segmented capture.
+
+    directory: where segments are written (created if missing)
+    segment_bytes: start a new segment once the current one reaches this size
+    index_every: seconds between sparse index entries
+    """
+
+    def __init__(self, directory, segment_bytes=256 * 2**20, index_every=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_every_ns = int(index_every * 1e9)
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index = None
+        self._offset = 0
+        self._next_index_ns = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_segment(self, timestamp_ns):
+        self._close_segment()
+        # "xb" never truncates an existing segment; a name already taken
+        # (e.g. recording again into a directory) gets a sequence suffix
+        name = f"{timestamp_ns:020d}"
+        seq = 0
+        while True:
+            base = os.path.join(self.directory, name if not seq else f"{name}-{seq}")
+            try:
+                self._segment = open(base + SEGMENT_SUFFIX, "xb")
+                break
+            except FileExistsError:
+                seq += 1
+        self._index = open(base + INDEX_SUFFIX, "wb")
+        self._segment.write(FILE_MAGIC)
+        self._offset = len(FILE_MAGIC)
+        self._next_index_ns = timestamp_ns
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+    def write(self, data, timestamp=None):
+        """
+        Append one datagram.  timestamp is epoch seconds (default: now).
+        """
+        timestamp_ns = time.time_ns() if timestamp is None else to_ns(timestamp)
+        with self._lock:
+            if self._segment is None or self._offset >= self.segment_bytes:
+                self._open_segment(timestamp_ns)
+            if timestamp_ns >= self._next_index_ns:
+                self._index.write(INDEX_ENTRY.pack(timestamp_ns, self._offset))
+                self._next_index_ns = timestamp_ns + self.index_every_ns
+            self._segment.write(RECORD.pack(timestamp_ns, len(data)))
+            self._segment.write(data)
+            self._offset += RECORD.size + len(data)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.flush()
+                self._index.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+
+class CaptureReader:
+    """
+    Replay a capture directory written by CaptureWriter.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.errors = 0
+        self.errors_by_type = collections.Counter()
+
+    def segments(self):
+        """
+        Sorted list of (first time ns, segment path) pairs.
+        """
+        out = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                first_ns, _, seq = name[: -len(SEGMENT_SUFFIX)].partition("-")
+                out.append((int(first_ns), int(seq or 0), os.path.join(self.directory, name)))
+        return [(first_ns, path) for first_ns, _, path in sorted(out)]
+
+    @staticmethod
+    def _seek_offset(segment_path, start_ns):
+        """
+        Offset of the last indexed record at or before start_ns.
+        """
+        index_path = segment_path[: -len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        if start_ns is None or not os.path.exists(index_path):
+            return len(FILE_MAGIC)
+        with open(index_path, "rb") as f:
+            raw = f.read()
+        entries = [
+            INDEX_ENTRY.unpack_from(raw, pos)
+            for pos in range(0, len(raw) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size)
+        ]
+        pos = bisect.bisect_right([ts for ts, _ in entries], start_ns) - 1
+        return entries[pos][1] if pos >= 0 else len(FILE_MAGIC)
+
+    def replay(self, start=None, end=None):
+        """
+        Yield (receive time in epoch seconds, memoryview) for every datagram
+        with start <= time < end.  The views point into the memory map and
+        are only valid until the generator moves past their segment.
+        """
+        start_ns, end_ns = to_ns(start), to_ns(end)
+        segments = self.segments()
+        for nn, (first_ns, path) in enumerate(segments):
+            if end_ns is not None and first_ns >= end_ns:
+                break
+            next_first_ns = segments[nn + 1][0] if nn + 1 < len(segments) else None
+            if start_ns is not None and next_first_ns is not None and next_first_ns <= start_ns:
+                continue
+            yield from self._replay_segment(path, start_ns, end_ns)
+
+    def _replay_segment(self, path, start_ns, end_ns):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= len(FILE_MAGIC):
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        try:
+            if bytes(view[: len(FILE_MAGIC)]) != FILE_MAGIC:
+                raise ValueError(f"{path} is not a capture segment")
+            offset = self._seek_offset(path, start_ns)
+            size = len(view)
+            while offset + RECORD.size <= size:
+                timestamp_ns, length = RECORD.unpack_from(view, offset)
+                offset += RECORD.size
+                if offset + length > size:
+                    # Partially written trailing record
+                    break
+                if end_ns is not None and timestamp_ns >= end_ns:
+                    break
+                if start_ns is None or timestamp_ns >= start_ns:
+                    yield timestamp_ns / 1e9, view[offset : offset + length]
+                offset += length
+        finally:
+            view.release()
+            try:
+                mm.close()
+            except BufferError:
+                # The caller still holds views; the map closes when they go
+                pass
+
+    def decode(self, start=None, end=None, decoder=None, yield_errors=False):
+        """
+        Yield decoded records with a "received_at" datetime added.  The
+        receive time is also passed to decoder so time fields land on the
+        day they were captured.
+
+        Records that fail to decode (the capture keeps every datagram, bad
+        ones included) are counted in errors / errors_by_type and skipped,
+        or with yield_errors come out as {"packet_type": "error", "error",
+        "data", "received_at"} records.
+        """
+        from func_parse import DecodeError
+
+        if decoder is None:
+            from func_parse import decode as decoder
+        for timestamp, data in self.replay(start, end):
+            received_at = datetime.datetime.fromtimestamp(
+                timestamp, datetime.timezone.utc
+            ).replace(tzinfo=None)
+            try:
+                rec = decoder(data, timestamp)
+            except DecodeError as e:
+                self.errors += 1
+                self.errors_by_type[type(e).__name__] += 1
+                if not yield_errors:
+                    continue
+                rec = {"packet_type": "error", "error": str(e), "data": bytes(data)}
+            rec["received_at"] = received_at
+            yield rec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay WSJT-X captures")
+    parser.add_argument("command", choices=["record", "replay"])
+    parser.add_argument("directory")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2237)
+    parser.add_argument("--start", help="UTC start time (replay)")
+    parser.add_argument("--end", help="UTC end time (replay)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        import asyncio
+        from listener import Listener
+
+        with CaptureWriter(args.directory) as writer:
+            listener = Listener(
+                lambda data: data,
+                handler=lambda rec: None,
+                ip=args.ip,
+                port=args.port,
+                on_raw=writer.write,
+            )
+            try:
+                asyncio.run(listener.serve_forever(stats_every=60))
+            except KeyboardInterrupt:
+                pass
+    else:
+        reader = CaptureReader(args.directory)
+        for rec in reader.decode(args.start, args.end):
+            print(rec)
+        if reader.errors:
+            print(f"skipped {reader.errors} bad records: {dict(reader.errors_by_type)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,194 +8,1019 @@ bytes, type/description
 4, unsigned integer schema number
 4, integer type of message, 0 for heartbeat, 1 for status, 2 for decode
 
-
+The module is a plain library: importing it does no I/O and only needs the
+standard library.  numpy and pandas are imported on first use by the
+vectorized helpers and decode_many().  The listener command line lives in
+listen.py.
 """
 
-import socket
-import inspect
+import codecs
 import datetime
-import pandas as pd
-
-# import time
+import itertools
 import struct
-from typing import Any
-
-
-def get_int8(data, index):
-    value = struct.unpack(">b", data[index : index + 1])[0]
-    return value, index + 1
-
-
-def get_int32(data, index):
-    value = struct.unpack(">i", data[index : index + 4])[0]
-    return value, index + 4
-
-
-def get_int64(data, index):
-    value = struct.unpack(">q", data[index : index + 8])[0]
-    return value, index + 8
-
-
-def get_unsigned32(data, index):
-    value = struct.unpack(">I", data[index : index + 4])[0]
-    return value, index + 4
-
-
-def get_utf8(data, index):
-    length = struct.unpack(">i", data[index : index + 4])[0]
-    if length <= 0:
-        length = 0
-        message = ""
-    else:
-        message = data[index + 4 : index + 4 + length].decode("utf-8")
-    new_index = index + 4 + length
-    return message, new_index
-
-
-def get_bool(data, index):
-    value = struct.unpack(">?", data[index : index + 1])[0]
-    return value, index + 1
-
-
-def get_time(data, index):
-    milliseconds_since_midnight, index = get_unsigned32(data, index)
-    seconds_since_midnight = milliseconds_since_midnight / 1000.0
-    utc_time = datetime.datetime.utcnow()
-    utc_date = datetime.datetime(utc_time.year, utc_time.month, utc_time.day)
-    time = utc_date + datetime.timedelta(seconds=seconds_since_midnight)
-    return time, index
-
-
-def get_double(data, index):
-    value = struct.unpack(">d", data[index : index + 8])[0]
-    return value, index + 8
-
-
-def get_datetime_tuple(data, index):
-    date_val, index = get_int64(data, index)
-    time_val, index = get_time(data, index)
-    timespec, index = get_int8(data, index)
-    return (date_val, time_val, timespec), index
+import time
+
+
+MAGIC = 0xADBCCBDA
+
+# Every packet starts with magic, schema number and message type
+HEADER = struct.Struct(">IIi")
+INT32 = struct.Struct(">i")
+
+# WSJT-X never sends anything close to this, so larger datagrams are garbage
+MAX_PACKET_BYTES = 16384
+MIN_SCHEMA = 2
+
+# Qt serializes a null QString/QByteArray as length 0xffffffff
+NULL_LENGTH = -1
+
+# QDateTime timespecs (Qt::LocalTime, Qt::UTC) serialized as julian day,
+# ms since midnight and timespec only
+FIXED_TIMESPECS = (0, 1)
+
+
+class DecodeError(ValueError):
+    """
+    A datagram that cannot be decoded.  offset is where decoding stopped.
+    """
+
+    def __init__(self, message, offset=0):
+        super().__init__(message)
+        self.offset = offset
+
+
+class BadHeader(DecodeError):
+    """Too short, too long, wrong magic or unsupported schema."""
+
+
+class TruncatedPacket(DecodeError):
+    """A field runs past the end of the datagram."""
+
+
+class BadString(DecodeError):
+    """A utf8 length prefix that does not fit the datagram, or bad utf-8."""
+
+
+class BadDateTime(DecodeError):
+    """
+    A QDateTime whose timespec is not local time or UTC.  Qt follows those
+    with an offset (OffsetFromUTC) or a time zone (TimeZone), which the
+    fixed "datetime" layout does not cover.
+    """
+
+
+# struct codes for the fixed width field types.  A "time" is milliseconds
+# since midnight, a "datetime" is (julian day, time, timespec) and a "color"
+# is a QColor (spec, alpha, red, green, blue, pad).  "utf8" is the only
+# variable width type and is decoded on its own.
+FIELD_CODES = {
+    "int8": "b",
+    "uint8": "B",
+    "bool": "?",
+    "int32": "i",
+    "unsigned32": "I",
+    "int64": "q",
+    "uint64": "Q",
+    "double": "d",
+    "time": "I",
+    "datetime": "qIb",
+    "color": "bHHHHH",
+}
+
+HEARTBEAT_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("max_schema_number", "int32"),
+    ("version", "utf8"),
+    ("revision", "utf8"),
+]
+
+STATUS_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("dial_frequency", "int64"),
+    ("mode", "utf8"),
+    ("dx_call", "utf8"),
+    ("report", "utf8"),
+    ("tx_mode", "utf8"),
+    ("tx_enabled", "bool"),
+    ("transmitting", "bool"),
+    ("decoding", "bool"),
+    ("rx_df", "int32"),
+    ("tx_df", "int32"),
+    ("de_call", "utf8"),
+    ("de_grid", "utf8"),
+    ("dx_grid", "utf8"),
+    ("tx_watchdog", "bool"),
+    ("sub_mode", "utf8"),
+    ("fast_mode", "bool"),
+    ("special_operation", "int8"),
+    ("freq_tolerance", "int32"),
+    ("tr_period", "int32"),
+    ("conf_name", "utf8"),
+    ("tx_message", "utf8"),
+]
+
+DECODE_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("new", "bool"),
+    ("time", "time"),
+    ("snr", "int32"),
+    ("delta_time", "double"),
+    ("delta_frequency", "int32"),
+    ("mode", "utf8"),
+    ("message", "utf8"),
+    ("low_confidence", "bool"),
+    ("off_air", "bool"),
+]
+
+QSO_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("time_tuple_off", "datetime"),
+    ("dx_call", "utf8"),
+    ("dx_grid", "utf8"),
+    ("tx_freq", "int64"),
+    ("mode", "utf8"),
+    ("report_sent", "utf8"),
+    ("report_received", "utf8"),
+    ("tx_power", "utf8"),
+    ("comments", "utf8"),
+    ("name", "utf8"),
+    ("time_tuple_on", "datetime"),
+    ("operator_call", "utf8"),
+    ("my_call", "utf8"),
+    ("my_grid", "utf8"),
+    ("exchange_sent", "utf8"),
+    ("exchange_received", "utf8"),
+    ("adif_propagation_mode", "utf8"),
+]
+
+ID_ONLY_SCHEMA = [
+    ("packet_id", "utf8"),
+]
+
+REPLY_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("time", "time"),
+    ("snr", "int32"),
+    ("delta_time", "double"),
+    ("delta_frequency", "unsigned32"),
+    ("mode", "utf8"),
+    ("message", "utf8"),
+    ("low_confidence", "bool"),
+    ("modifiers", "uint8"),
+]
+
+HALT_TX_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("auto_tx_only", "bool"),
+]
+
+FREE_TEXT_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("text", "utf8"),
+    ("send", "bool"),
+]
+
+WSPR_DECODE_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("new", "bool"),
+    ("time", "time"),
+    ("snr", "int32"),
+    ("delta_time", "double"),
+    ("frequency", "uint64"),
+    ("drift", "int32"),
+    ("callsign", "utf8"),
+    ("grid", "utf8"),
+    ("power", "int32"),
+    ("off_air", "bool"),
+]
+
+LOCATION_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("location", "utf8"),
+]
+
+LOGGED_ADIF_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("adif", "utf8"),
+]
+
+HIGHLIGHT_CALLSIGN_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("callsign", "utf8"),
+    ("background", "color"),
+    ("foreground", "color"),
+    ("highlight_last", "bool"),
+]
+
+SWITCH_CONFIGURATION_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("configuration_name", "utf8"),
+]
+
+CONFIGURE_SCHEMA = [
+    ("packet_id", "utf8"),
+    ("mode", "utf8"),
+    ("freq_tolerance", "unsigned32"),
+    ("sub_mode", "utf8"),
+    ("fast_mode", "bool"),
+    ("tr_period", "unsigned32"),
+    ("rx_df", "unsigned32"),
+    ("dx_call", "utf8"),
+    ("dx_grid", "utf8"),
+    ("generate_messages", "bool"),
+]
+
+# Registry of every WSJT-X message as (type id, name, schema).  Decoders,
+# encoders, lazy layouts and columnar decoders are all generated from this
+# table at import time.  Clear is listed with the fields clients send (the
+# server to client form adds a window byte, which decoding ignores).
+MESSAGE_TYPES = [
+    (0, "heartbeat", HEARTBEAT_SCHEMA),
+    (1, "status", STATUS_SCHEMA),
+    (2, "decode", DECODE_SCHEMA),
+    (3, "clear", ID_ONLY_SCHEMA),
+    (4, "reply", REPLY_SCHEMA),
+    (5, "qso", QSO_SCHEMA),
+    (6, "close", ID_ONLY_SCHEMA),
+    (7, "replay", ID_ONLY_SCHEMA),
+    (8, "halt_tx", HALT_TX_SCHEMA),
+    (9, "free_text", FREE_TEXT_SCHEMA),
+    (10, "wspr_decode", WSPR_DECODE_SCHEMA),
+    (11, "location", LOCATION_SCHEMA),
+    (12, "logged_adif", LOGGED_ADIF_SCHEMA),
+    (13, "highlight_callsign", HIGHLIGHT_CALLSIGN_SCHEMA),
+    (14, "switch_configuration", SWITCH_CONFIGURATION_SCHEMA),
+    (15, "configure", CONFIGURE_SCHEMA),
+]
+
+PACKET_TYPES = {type_id: name for type_id, name, _ in MESSAGE_TYPES}
+PACKET_TYPE_IDS = {name: type_id for type_id, name, _ in MESSAGE_TYPES}
+SCHEMAS = {name: schema for _, name, schema in MESSAGE_TYPES}
+
+
+# -- Time conversion --------------------------------------------------------
+# WSJT-X sends times as milliseconds since UTC midnight and dates as Qt julian
+# day numbers.  The day a time belongs to is taken from a reference time:
+# wall clock time when live, the receive time when replaying a capture.
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_DAY = datetime.timedelta(days=1)
+DAY_MS = 86_400_000
+HALF_DAY_MS = DAY_MS // 2
+
+# Qt julian day number of 1970-01-01
+JULIAN_DAY_EPOCH = 2440588
+
+
+class UtcDay:
+    """
+    Caches the UTC midnight of the current day and only recomputes it when
+    a reference time falls outside that day.
+    """
+
+    def __init__(self):
+        # (day start, day end, midnight) swapped as one tuple so threads
+        # never see a half updated day
+        self._day = (0.0, 0.0, EPOCH)
+
+    def __call__(self, now):
+        """
+        Return (day start in epoch seconds, midnight datetime) for now.
+        """
+        start, end, midnight = self._day
+        if not start <= now < end:
+            start = now - now % 86400
+            midnight = EPOCH + datetime.timedelta(seconds=start)
+            self._day = (start, start + 86400, midnight)
+        return start, midnight
+
+
+utc_day = UtcDay()
+
+
+def ms_to_time(milliseconds_since_midnight, now=None):
+    """
+    Convert ms since UTC midnight to a datetime on the UTC day of now
+    (epoch seconds, default wall clock).  Times more than 12 hours ahead of
+    now are from just before midnight and go on the previous day.
+    """
+    if now is None:
+        now = time.time()
+    start, midnight = utc_day(now)
+    if milliseconds_since_midnight > (now - start) * 1000 + HALF_DAY_MS:
+        midnight -= ONE_DAY
+    return midnight + datetime.timedelta(milliseconds=milliseconds_since_midnight)
+
+
+def time_of_day_ms(value):
+    """
+    ms since midnight of a datetime, or value unchanged if already ms.
+    """
+    if isinstance(value, datetime.datetime):
+        midnight = value.replace(hour=0, minute=0, second=0, microsecond=0)
+        return (value - midnight) // datetime.timedelta(milliseconds=1)
+    return value
 
 
 def time_tuple_to_timestamp(time_tuple):
+    """
+    Combine a decoded (julian day, time, timespec) tuple into one datetime.
+    time may be ms since midnight or the datetime produced by decode().
+    """
     date_val, time_val, timespec = time_tuple
-    timestamp = pd.to_datetime(date_val, unit="D", origin="julian") + pd.to_timedelta(
-        time_val, unit="s"
+    return EPOCH + datetime.timedelta(
+        days=date_val - JULIAN_DAY_EPOCH, milliseconds=time_of_day_ms(time_val)
     )
-    return timestamp
-
 
-def _decode_heartbeat(rec, data, index):
-    rec["packet_id"], index = get_utf8(data, index)
-    rec["max_schema_number"], index = get_int32(data, index)
-    rec["version"], index = get_utf8(data, index)
-    rec["revision"], index = get_utf8(data, index)
-    return rec, index
 
-
-def _decode_status(rec, data, index):
-    rec["packet_id"], index = get_utf8(data, index)
-    rec["dial_frequency"], index = get_int64(data, index)
-    rec["mode"], index = get_utf8(data, index)
-    rec["dx_call"], index = get_utf8(data, index)
-    rec["report"], index = get_utf8(data, index)
-    rec["tx_mode"], index = get_utf8(data, index)
-    rec["tx_enabled"], index = get_bool(data, index)
-    rec["transmitting"], index = get_bool(data, index)
-    rec["decoding"], index = get_bool(data, index)
-    rec["rx_df"], index = get_int32(data, index)
-    rec["tx_df"], index = get_int32(data, index)
-    rec["de_call"], index = get_utf8(data, index)
-    rec["de_grid"], index = get_utf8(data, index)
-    rec["dx_grid"], index = get_utf8(data, index)
-    rec["tx_watchdog"], index = get_bool(data, index)
-    rec["sub_mode"], index = get_utf8(data, index)
-    rec["fast_mode"], index = get_bool(data, index)
-    rec["special_operation"], index = get_int8(data, index)
-    rec["freq_tolerance"], index = get_int32(data, index)
-    rec["tr_period"], index = get_int32(data, index)
-    rec["conf_name"], index = get_utf8(data, index)
-    rec["tx_message"], index = get_utf8(data, index)
+def ms_to_datetime64(milliseconds, received_at=None):
+    """
+    Vectorized ms_to_time().  received_at is epoch seconds, either one value
+    or an array matching milliseconds (default wall clock).  Returns
+    datetime64[ns].
+    """
+    import numpy as np
+
+    now = np.asarray(time.time() if received_at is None else received_at, dtype=np.float64)
+    now_ms = np.floor(now * 1000).astype(np.int64)
+    day_start = now_ms - now_ms % DAY_MS
+    milliseconds = np.asarray(milliseconds).astype(np.int64)
+    day_start = np.where(
+        milliseconds > now_ms - day_start + HALF_DAY_MS, day_start - DAY_MS, day_start
+    )
+    return (day_start + milliseconds).astype("datetime64[ms]").astype("datetime64[ns]")
+
+
+def julian_to_datetime64(days, milliseconds, timespec=None):
+    """
+    Vectorized time_tuple_to_timestamp() for arrays of julian days and ms
+    since midnight, as sent in QSO Logged messages.  Returns datetime64[ns].
+    Times are taken as UTC; when timespec is given, entries that are not UTC
+    (timespec != 1) come back as NaT.
+    """
+    import numpy as np
+
+    total_ms = (np.asarray(days).astype(np.int64) - JULIAN_DAY_EPOCH) * DAY_MS + np.asarray(
+        milliseconds
+    ).astype(np.int64)
+    out = total_ms.astype("datetime64[ms]").astype("datetime64[ns]")
+    if timespec is not None:
+        out[np.asarray(timespec) != 1] = np.datetime64("NaT")
+    return out
+
+
+def _make_converter(types):
+    """
+    Return a function mapping the raw values unpacked for a run of fixed
+    fields onto one value per field, or None if no field needs converting.
+    Fields made of several raw values (datetime, color) become tuples.
+
+    The layout of the run is worked out here once, so the returned function
+    only indexes into values.
+    """
+    plan = []
+    index = 0
+    for field_type in types:
+        width = len(FIELD_CODES[field_type])
+        plan.append((field_type, index, index + width))
+        index += width
+    times = tuple(start for field_type, start, stop in plan if field_type == "time")
+    if len(plan) == index and not times:
+        return None
+
+    if len(plan) == index:
+        # Single value fields only: convert the times in place
+        def convert_times(values, now):
+            values = list(values)
+            for i in times:
+                values[i] = ms_to_time(values[i], now)
+            return values
+
+        return convert_times
+
+    plan = tuple(plan)
+
+    def convert(values, now):
+        out = []
+        for field_type, start, stop in plan:
+            if field_type == "time":
+                out.append(ms_to_time(values[start], now))
+            elif field_type == "datetime":
+                timespec = values[start + 2]
+                if timespec not in FIXED_TIMESPECS:
+                    raise BadDateTime(f"unsupported QDateTime timespec {timespec}")
+                out.append((values[start], ms_to_time(values[start + 1], now), timespec))
+            elif stop - start > 1:
+                out.append(values[start:stop])
+            else:
+                out.append(values[start])
+        return out
+
+    return convert
+
+
+def group_schema(schema):
+    """
+    Split a schema into runs of consecutive fixed width fields.
+
+    Returns a list of (names, types) runs.  Each utf8 field is its own run
+    with names set to the bare field name and types set to "utf8".
+    """
+    runs = []
+    names, types = [], []
+    for name, field_type in schema:
+        if field_type == "utf8":
+            if names:
+                runs.append((tuple(names), tuple(types)))
+                names, types = [], []
+            runs.append((name, "utf8"))
+        else:
+            names.append(name)
+            types.append(field_type)
+    if names:
+        runs.append((tuple(names), tuple(types)))
+    return runs
+
+
+def compile_schema(schema):
+    """
+    Compile a list of (name, type) fields into a list of decoding steps.
+
+    Consecutive fixed width fields are merged into a single struct.Struct so
+    that the whole run is read with one unpack_from call.  Each step is a
+    (struct, names, converter) tuple.  utf8 fields get a step with a struct
+    of None and the bare field name.
+    """
+    steps = []
+    for names, types in group_schema(schema):
+        if types == "utf8":
+            steps.append((None, names, None))
+        else:
+            fixed = struct.Struct(">" + "".join(FIELD_CODES[t] for t in types))
+            steps.append((fixed, names, _make_converter(types)))
+    return steps
+
+
+def decode_fields(steps, rec, view, index, now=None):
+    """
+    Run compiled steps over a memoryview starting at index, filling rec.
+    now is the reference time for time fields (see ms_to_time).
+
+    Every read is bounds checked against the datagram, so malformed input
+    raises TruncatedPacket or BadString rather than a struct.error.
+    """
+    size = len(view)
+    read_length = INT32.unpack_from
+    utf_8_decode = codecs.utf_8_decode
+    for fixed, names, convert in steps:
+        if fixed is None:
+            if index + 4 > size:
+                raise TruncatedPacket(f"{names}: missing length prefix", index)
+            (length,) = read_length(view, index)
+            index += 4
+            if length > 0:
+                if length > size - index:
+                    raise BadString(
+                        f"{names}: length {length} exceeds {size - index} remaining bytes",
+                        index,
+                    )
+                try:
+                    rec[names] = utf_8_decode(view[index : index + length], None, True)[0]
+                except UnicodeDecodeError:
+                    raise BadString(f"{names}: invalid utf-8", index) from None
+                index += length
+            elif length == 0 or length == NULL_LENGTH:
+                rec[names] = ""
+            else:
+                raise BadString(f"{names}: negative length {length}", index)
+        else:
+            if index + fixed.size > size:
+                raise TruncatedPacket(f"{names[0]}: packet ends at byte {size}", index)
+            values = fixed.unpack_from(view, index)
+            if convert is not None:
+                try:
+                    values = convert(values, now)
+                except BadDateTime as e:
+                    e.offset = index
+                    raise
+            index += fixed.size
+            rec.update(zip(names, values))
     return rec, index
 
 
-def _decode_decode(rec, data, index):
-    rec["packet_id"], index = get_utf8(data, index)
-    rec["new"], index = get_bool(data, index)
-    rec["time"], index = get_time(data, index)
-    rec["snr"], index = get_int32(data, index)
-    rec["delta_time"], index = get_double(data, index)
-    rec["delta_frequency"], index = get_int32(data, index)
-    rec["mode"] = get_utf8(data, index)
-    rec["message"] = get_utf8(data, index)
-    rec["low_confidence"] = get_bool(data, index)
-    rec["off_air"] = get_bool(data, index)
-    return rec, index
-
+def check_header(view):
+    """
+    Validate and unpack the 12 byte header in constant time.  Returns
+    (magic, schema, packet type index) or raises BadHeader.
+    """
+    size = len(view)
+    if size < HEADER.size:
+        raise BadHeader(f"{size} byte datagram is shorter than the header")
+    if size > MAX_PACKET_BYTES:
+        raise BadHeader(f"{size} byte datagram exceeds {MAX_PACKET_BYTES} bytes")
+    magic, schema, packet_type_index = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise BadHeader(f"bad magic {magic:#x}")
+    if schema < MIN_SCHEMA:
+        raise BadHeader(f"unsupported schema {schema}")
+    return magic, schema, packet_type_index
+
+
+# Decoder dispatch: (name, compiled steps) indexed by message type id
+UNKNOWN = ("unknown", None)
+DISPATCH = [UNKNOWN] * (max(PACKET_TYPES) + 1)
+for _type_id, _name, _schema in MESSAGE_TYPES:
+    DISPATCH[_type_id] = (_name, compile_schema(_schema))
+
+
+def decode(data, received_at=None):
+    """
+    Decode one datagram into a dict.  received_at (epoch seconds) fixes the
+    UTC day of time fields, which keeps capture replays deterministic.
+    Raises a DecodeError subclass for malformed datagrams.
+    """
+    view = memoryview(data)
+    magic, schema, packet_type_index = check_header(view)
+    if 0 <= packet_type_index < len(DISPATCH):
+        packet_type, steps = DISPATCH[packet_type_index]
+    else:
+        packet_type, steps = UNKNOWN
 
-def _decode_qso(rec, data, index):
-    rec["packet_id"], index = get_utf8(data, index)
-    rec["time_tuple_off"], index = get_datetime_tuple(data, index)
-    rec["dx_call"], index = get_utf8(data, index)
-    rec["dx_grid"], index = get_utf8(data, index)
-    rec["tx_freq"], index = get_int64(data, index)
-    rec["mode"], index = get_utf8(data, index)
-    rec["report_sent"], index = get_utf8(data, index)
-    rec["report_received"], index = get_utf8(data, index)
-    rec["tx_power"], index = get_utf8(data, index)
-    rec["comments"], index = get_utf8(data, index)
-    rec["name"], index = get_utf8(data, index)
-    rec["time_tuple_on"], index = get_datetime_tuple(data, index)
-    rec["operator_call"], index = get_utf8(data, index)
-    rec["my_call"], index = get_utf8(data, index)
-    rec["my_grid"], index = get_utf8(data, index)
-    rec["exchange_sent"], index = get_utf8(data, index)
-    rec["exchange_received"], index = get_utf8(data, index)
-    rec["adif_propagation_mode"], index = get_utf8(data, index)
-    return rec, index
+    rec = {"magic": magic, "schema": schema, "packet_type": packet_type}
+    if steps is not None:
+        rec, index = decode_fields(steps, rec, view, HEADER.size, received_at)
+    return rec
 
 
-def decode(data):
-    packet_type_lookup = {
-        0: "heartbeat",
-        1: "status",
-        2: "decode",
-        5: "qso",
+def try_decode(data, received_at=None):
+    """
+    decode() that never raises for bad input.  Returns (rec, None) or
+    (None, DecodeError).
+    """
+    try:
+        return decode(data, received_at), None
+    except DecodeError as e:
+        return None, e
+
+
+def _make_flattener(types):
+    """
+    Inverse of _make_converter: map field values onto the raw values packed
+    for a run of fixed fields, or None if every field is a single raw value.
+    """
+    if not any(t in ("time", "datetime") or len(FIELD_CODES[t]) > 1 for t in types):
+        return None
+
+    def flatten(values):
+        out = []
+        for field_type, value in zip(types, values):
+            if field_type == "time":
+                out.append(time_of_day_ms(value))
+            elif field_type == "datetime":
+                date_val, time_val, timespec = value
+                if timespec not in FIXED_TIMESPECS:
+                    raise ValueError(f"cannot encode QDateTime timespec {timespec}")
+                out.extend((date_val, time_of_day_ms(time_val), timespec))
+            elif len(FIELD_CODES[field_type]) > 1:
+                out.extend(value)
+            else:
+                out.append(value)
+        return out
+
+    return flatten
+
+
+def compile_encoder(schema):
+    """
+    Encoding counterpart of compile_schema(): the same steps, with a
+    flattener in place of the converter.
+    """
+    steps = []
+    for names, types in group_schema(schema):
+        if types == "utf8":
+            steps.append((None, names, None))
+        else:
+            fixed = struct.Struct(">" + "".join(FIELD_CODES[t] for t in types))
+            steps.append((fixed, names, _make_flattener(types)))
+    return steps
+
+
+ENCODERS = {name: (type_id, compile_encoder(schema)) for type_id, name, schema in MESSAGE_TYPES}
+
+
+def _encode_strings(steps, rec):
+    """
+    utf-8 encode the string fields of rec (None for a null string) and
+    return them with the total datagram size.
+    """
+    strings = []
+    size = HEADER.size
+    for fixed, names, _ in steps:
+        if fixed is None:
+            value = rec[names]
+            raw = None if value is None else value.encode("utf-8")
+            strings.append(raw)
+            size += 4 + (len(raw) if raw else 0)
+        else:
+            size += fixed.size
+    return strings, size
+
+
+def _pack_fields(buffer, index, steps, strings, rec):
+    raw_strings = iter(strings)
+    for fixed, names, flatten in steps:
+        if fixed is None:
+            raw = next(raw_strings)
+            if raw is None:
+                INT32.pack_into(buffer, index, NULL_LENGTH)
+                index += 4
+            else:
+                INT32.pack_into(buffer, index, len(raw))
+                buffer[index + 4 : index + 4 + len(raw)] = raw
+                index += 4 + len(raw)
+        else:
+            values = [rec[name] for name in names]
+            if flatten is not None:
+                values = flatten(values)
+            fixed.pack_into(buffer, index, *values)
+            index += fixed.size
+    return index
+
+
+def encode(packet_type, rec, schema=3):
+    """
+    Serialize rec (a dict shaped like decode() output; only the schema fields
+    are read) into a new bytearray.  A utf8 field of None is sent as a Qt
+    null string.
+    """
+    type_id, steps = ENCODERS[packet_type]
+    strings, size = _encode_strings(steps, rec)
+    buffer = bytearray(size)
+    HEADER.pack_into(buffer, 0, MAGIC, schema, type_id)
+    _pack_fields(buffer, HEADER.size, steps, strings, rec)
+    return buffer
+
+
+def encode_into(buffer, offset, packet_type, rec, schema=3):
+    """
+    encode() into an existing writable buffer at offset, so a sender can
+    reuse one preallocated bytearray.  Returns the offset just past the
+    datagram.
+    """
+    type_id, steps = ENCODERS[packet_type]
+    strings, size = _encode_strings(steps, rec)
+    if offset + size > len(buffer):
+        raise ValueError(f"{packet_type} needs {size} bytes, {len(buffer) - offset} available")
+    HEADER.pack_into(buffer, offset, MAGIC, schema, type_id)
+    return _pack_fields(buffer, offset + HEADER.size, steps, strings, rec)
+
+
+def _read_utf8(view, offset, now=None):
+    # Lengths were bounds checked when PacketView computed the offsets
+    length = INT32.unpack_from(view, offset)[0]
+    if length <= 0:
+        return ""
+    try:
+        return str(view[offset + 4 : offset + 4 + length], "utf-8")
+    except UnicodeDecodeError:
+        raise BadString("invalid utf-8", offset) from None
+
+
+def _make_reader(field_type):
+    """
+    Return a reader(view, offset, now) for a single field of the given type.
+    """
+    if field_type == "utf8":
+        return _read_utf8
+    fixed = struct.Struct(">" + FIELD_CODES[field_type])
+    if field_type == "color":
+        return lambda view, offset, now: fixed.unpack_from(view, offset)
+    if field_type == "time":
+        return lambda view, offset, now: ms_to_time(fixed.unpack_from(view, offset)[0], now)
+    if field_type == "datetime":
+
+        def read_datetime(view, offset, now):
+            date_val, time_val, timespec = fixed.unpack_from(view, offset)
+            if timespec not in FIXED_TIMESPECS:
+                raise BadDateTime(f"unsupported QDateTime timespec {timespec}", offset)
+            return (date_val, ms_to_time(time_val, now), timespec)
+
+        return read_datetime
+    return lambda view, offset, now: fixed.unpack_from(view, offset)[0]
+
+
+def compile_layout(schema):
+    """
+    Compile a schema for PacketView.  Returns (fields, steps) where fields
+    maps a field name to (position, reader) and steps is the list used to
+    walk a packet and find the offset of every position.  Fixed width runs
+    are a (size, relative offsets, relative timespec offsets) step, utf8
+    fields a (None, None, ()) step.  The timespecs of datetime fields are
+    checked on the walk, as a datetime that is not fixed width would
+    misplace every later field.
+    """
+    fields = {}
+    steps = []
+    for names, types in group_schema(schema):
+        if types == "utf8":
+            fields[names] = (len(fields), _read_utf8)
+            steps.append((None, None, ()))
+            continue
+        relative = []
+        timespecs = []
+        size = 0
+        for name, field_type in zip(names, types):
+            fields[name] = (len(fields), _make_reader(field_type))
+            relative.append(size)
+            size += struct.calcsize(">" + FIELD_CODES[field_type])
+            if field_type == "datetime":
+                timespecs.append(size - 1)
+        steps.append((size, tuple(relative), tuple(timespecs)))
+    return fields, steps
+
+
+LAYOUTS = {name: compile_layout(schema) for name, schema in SCHEMAS.items()}
+
+
+class PacketView:
+    """
+    Lazy, read-only view of a packet that decodes fields only when read.
+
+    The header is unpacked up front.  Field offsets are found on the first
+    field access by walking the utf8 length prefixes, and each field is then
+    decoded straight out of the original buffer on every read, so a filter
+    such as
+
+        packet = PacketView(data)
+        if packet.packet_type == "decode" and packet.snr > -10:
+            ...
+
+    never touches the message strings.  to_dict() gives the same dict as
+    decode().  received_at is passed on to time fields as in decode().
+    """
+
+    __slots__ = ("_view", "_offsets", "magic", "schema", "packet_type", "received_at")
+
+    def __init__(self, data, received_at=None):
+        self._view = memoryview(data)
+        self.received_at = received_at
+        self.magic, self.schema, packet_type_index = check_header(self._view)
+        self.packet_type = PACKET_TYPES.get(packet_type_index, "unknown")
+        self._offsets = None
+
+    def _compute_offsets(self):
+        offsets = []
+        index = HEADER.size
+        view = self._view
+        end = len(view)
+        for size, relative, timespecs in LAYOUTS[self.packet_type][1]:
+            if size is None:
+                if index + 4 > end:
+                    raise TruncatedPacket("missing length prefix", index)
+                offsets.append(index)
+                length = INT32.unpack_from(view, index)[0]
+                if length < NULL_LENGTH or length > end - index - 4:
+                    raise BadString(f"bad string length {length}", index)
+                index += 4 + max(length, 0)
+            else:
+                if index + size > end:
+                    raise TruncatedPacket(f"packet ends at byte {end}", index)
+                for rel in timespecs:
+                    if view[index + rel] not in FIXED_TIMESPECS:
+                        raise BadDateTime(
+                            f"unsupported QDateTime timespec {view[index + rel]}", index + rel
+                        )
+                offsets.extend(index + rel for rel in relative)
+                index += size
+        self._offsets = offsets
+        return offsets
+
+    def __getattr__(self, name):
+        # Only reached for names that are not slots, i.e. packet fields
+        layout = LAYOUTS.get(self.packet_type)
+        if layout is None or name not in layout[0]:
+            raise AttributeError(name)
+        position, reader = layout[0][name]
+        offsets = self._offsets
+        if offsets is None:
+            offsets = self._compute_offsets()
+        return reader(self._view, offsets[position], self.received_at)
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def keys(self):
+        fields = LAYOUTS[self.packet_type][0] if self.packet_type in LAYOUTS else {}
+        return ["magic", "schema", "packet_type", *fields]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.keys()}
+
+    def __repr__(self):
+        return f"PacketView(packet_type={self.packet_type!r}, bytes={len(self._view)})"
+
+
+# numpy dtypes matching FIELD_CODES, used for columnar decoding
+FIELD_DTYPES = {
+    "int8": [("", ">i1")],
+    "bool": [("", "?")],
+    "int32": [("", ">i4")],
+    "unsigned32": [("", ">u4")],
+    "int64": [("", ">i8")],
+    "double": [("", ">f8")],
+    "time": [("", ">u4")],
+    "datetime": [("_date", ">i8"), ("_time", ">u4"), ("_timespec", "i1")],
+    "uint8": [("", "u1")],
+    "uint64": [("", ">u8")],
+    "color": [
+        ("_spec", "i1"),
+        ("_alpha", ">u2"),
+        ("_red", ">u2"),
+        ("_green", ">u2"),
+        ("_blue", ">u2"),
+        ("_pad", ">u2"),
+    ],
+}
+
+
+def compile_columns(schema):
+    """
+    Compile a schema into steps for decode_many().  Fixed width runs become a
+    packed big-endian numpy structured dtype, utf8 fields stay as their name.
+    """
+    import numpy as np
+
+    steps = []
+    for names, types in group_schema(schema):
+        if types == "utf8":
+            steps.append((None, names, None))
+        else:
+            dtype = np.dtype(
+                [
+                    (name + suffix, code)
+                    for name, field_type in zip(names, types)
+                    for suffix, code in FIELD_DTYPES[field_type]
+                ]
+            )
+            steps.append((dtype, names, types))
+    return steps
+
+
+# Built by column_decoders() on the first decode_many(), so plain decode()
+# users never import numpy
+_COLUMN_DECODERS = None
+
+
+def column_decoders():
+    global _COLUMN_DECODERS
+    if _COLUMN_DECODERS is None:
+        _COLUMN_DECODERS = {name: compile_columns(schema) for name, schema in SCHEMAS.items()}
+    return _COLUMN_DECODERS
+
+
+def _gather(arr, offsets, dtype):
+    """
+    Read one dtype sized record at each offset of a flat uint8 array.
+    """
+    import numpy as np
+
+    offsets = np.where(offsets + dtype.itemsize <= len(arr), offsets, 0)
+    index = offsets[:, None] + np.arange(dtype.itemsize)
+    return np.ascontiguousarray(arr[index]).view(dtype)[:, 0]
+
+
+def _utf8_column(blob, starts, lengths, interned):
+    """
+    Decode strings out of blob, sharing one str object per distinct value.
+    """
+    import numpy as np
+
+    column = np.empty(len(starts), dtype=object)
+    for row, (start, length) in enumerate(zip(starts.tolist(), lengths.tolist())):
+        raw = blob[start : start + length]
+        value = interned.get(raw)
+        if value is None:
+            value = interned[raw] = raw.decode("utf-8", errors="replace")
+        column[row] = value
+    return column
+
+
+def _decode_group(packet_type, buffers, interned, received_at=None):
+    import numpy as np
+    import pandas as pd
+
+    blob = b"".join(buffers)
+    arr = np.frombuffer(blob, dtype=np.uint8)
+    sizes = np.fromiter((len(b) for b in buffers), dtype=np.int64, count=len(buffers))
+    ends = np.cumsum(sizes)
+    offsets = ends - sizes
+
+    header = _gather(arr, offsets, np.dtype([("magic", ">u4"), ("schema", ">u4")]))
+    columns = {
+        "magic": header["magic"].astype(np.uint32),
+        "schema": header["schema"].astype(np.uint32),
     }
-
-    rec = {}
-    index = 0
-
-    rec["magic"], index = get_unsigned32(data, index)
-
-    rec["schema"], index = get_unsigned32(data, index)
-
-    packet_type_index, index = get_int32(data, index)
-    rec["packet_type"] = packet_type_lookup.get(packet_type_index, "unknown")
-
-    if rec["packet_type"] == "heartbeat":
-        rec, index = _decode_heartbeat(rec, data, index)
-    elif rec["packet_type"] == "status":
-        rec, index = _decode_status(rec, data, index)
-    elif rec["packet_type"] == "decode":
-        rec, index = _decode_decode(rec, data, index)
-    elif rec["packet_type"] == "qso":
-        rec, index = _decode_qso(rec, data, index)
-    return rec
+    offsets = offsets + HEADER.size
+    valid = np.ones(len(buffers), dtype=bool)
+
+    for dtype, names, types in column_decoders()[packet_type]:
+        if dtype is None:
+            valid &= offsets + 4 <= ends
+            lengths = _gather(arr, offsets, np.dtype(">i4")).astype(np.int64)
+            valid &= lengths >= NULL_LENGTH
+            lengths = np.where(valid, np.maximum(lengths, 0), 0)
+            valid &= offsets + 4 + lengths <= ends
+            lengths = np.where(valid, lengths, 0)
+            columns[names] = _utf8_column(blob, offsets + 4, lengths, interned)
+            offsets = offsets + 4 + lengths
+            continue
+
+        valid &= offsets + dtype.itemsize <= ends
+        rows = _gather(arr, offsets, dtype)
+        offsets = offsets + dtype.itemsize
+        for name, field_type in zip(names, types):
+            if field_type == "time":
+                columns[name] = ms_to_datetime64(rows[name], received_at)
+            elif field_type == "datetime":
+                valid &= np.isin(rows[name + "_timespec"], FIXED_TIMESPECS)
+                columns[name] = julian_to_datetime64(
+                    rows[name + "_date"], rows[name + "_time"]
+                )
+            elif field_type == "color":
+                parts = [rows[name + suffix].tolist() for suffix, _ in FIELD_DTYPES["color"]]
+                column = np.empty(len(rows), dtype=object)
+                column[:] = list(zip(*parts))
+                columns[name] = column
+            else:
+                columns[name] = rows[name].astype(rows[name].dtype.newbyteorder("="))
+
+    frame = pd.DataFrame(columns)
+    if not valid.all():
+        frame = frame[valid].reset_index(drop=True)
+    return frame
+
+
+def decode_many(buffers, received_at=None):
+    """
+    Decode a batch of raw datagrams into one DataFrame per packet type.
+
+    Packets are grouped by type and each group is decoded a schema step at a
+    time across all of its packets, so fixed width fields land directly in
+    numpy columns.  Repeated strings (calls, grids, modes) share a single str
+    object.  Packets with a bad header, truncated packets, unknown types
+    and datetimes that decode() rejects with BadDateTime are dropped.
+
+    received_at is an optional sequence of receive times (epoch seconds),
+    one per buffer, that fixes the UTC day of time fields as in decode().
+
+    Returns a dict keyed by packet type name ("heartbeat", "status",
+    "decode", "qso", ...).  QSO datetime fields are returned as timestamps.
+    """
+    import numpy as np
+    import pandas as pd
+
+    groups = {name: [] for name in SCHEMAS}
+    times = {name: [] for name in SCHEMAS}
+    if received_at is None:
+        received_at = itertools.repeat(time.time())
+    for data, when in zip(buffers, received_at):
+        try:
+            packet_type = PACKET_TYPES.get(check_header(memoryview(data))[2])
+        except BadHeader:
+            continue
+        if packet_type is not None:
+            groups[packet_type].append(bytes(data))
+            times[packet_type].append(when)
+
+    interned = {}
+    frames = {}
+    for packet_type, group in groups.items():
+        if group:
+            frames[packet_type] = _decode_group(
+                packet_type, group, interned, np.asarray(times[packet_type], dtype=np.float64)
+            )
+        else:
+            names = ["magic", "schema"] + [name for name, _ in SCHEMAS[packet_type]]
+            frames[packet_type] = pd.DataFrame(columns=names)
+    return frames
 
 
 RX_CALL = "N0CALL"
 UDP_IP = "127.0.0.1"
 UDP_PORT = 2237
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-sock.bind((UDP_IP, UDP_PORT))
 
-while True:
-    data, addr = sock.recvfrom(1024)  # Buffer size is 1024 bytes
-    rec = decode(data)
-    print(rec)
+if __name__ == "__main__":
+    # Kept for old habits, the listener itself is in listen.py
+    from listen import main
+
+    main()
 
 
 # class BasePacket:
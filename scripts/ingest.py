@@ -0,0 +1,280 @@
+#! /usr/bin/env python
+"""
+Multi-process ingest for several WSJT-X instances.
+
+Each receiver process binds its own socket, either all on one port with
+SO_REUSEPORT (the kernel fans datagrams out across them) or one per port
+from a list, decodes locally with func_parse.decode() and ships batches of
+compact records (bare value tuples) to the aggregator over a pipe.
+
+    # four receivers sharing port 2237
+    python scripts/ingest.py listen --processes 4
+
+    # one receiver per band instance
+    python scripts/ingest.py listen --ports 2237 2238 2239
+
+    # replay synthetic packets at the collector from 8 source sockets
+    python scripts/ingest.py loadgen --senders 8 --seconds 10
+
+    # measure decode throughput for 1, 2 and 4 receivers
+    python scripts/ingest.py bench --processes 1 2 4
+"""
+
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import socket
+import sys
+import time
+
+import func_parse
+
+RECV_BUFFER_BYTES = 65536
+
+HEADER_NAMES = ("magic", "schema", "packet_type")
+
+FIELD_NAMES = {
+    packet_type: HEADER_NAMES + tuple(name for name, _ in schema)
+    for packet_type, schema in func_parse.SCHEMAS.items()
+}
+
+
+def open_socket(ip, port, reuse_port=False, timeout=0.2):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not available on this platform")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind((ip, port))
+    sock.settimeout(timeout)
+    return sock
+
+
+def receiver(conn, stop, ip, port, reuse_port, batch_size=256, max_delay=0.1):
+    """
+    Receiver process body: decode datagrams and send batches of value tuples
+    down conn until stop is set.  A final (None, counts) message reports the
+    number of packets received and malformed.
+    """
+    sock = open_socket(ip, port, reuse_port)
+    decode = func_parse.decode
+    # Datagrams are decoded straight out of one preallocated buffer that is
+    # large enough for any UDP payload, so nothing is ever truncated
+    buffer = bytearray(RECV_BUFFER_BYTES)
+    view = memoryview(buffer)
+    batch = []
+    received = malformed = 0
+    last_flush = time.monotonic()
+    while not stop.is_set():
+        try:
+            nbytes, _ = sock.recvfrom_into(buffer)
+        except socket.timeout:
+            nbytes = None
+        if nbytes is not None:
+            received += 1
+            try:
+                batch.append(tuple(decode(view[:nbytes]).values()))
+            except func_parse.DecodeError:
+                malformed += 1
+        now = time.monotonic()
+        if batch and (len(batch) >= batch_size or now - last_flush > max_delay):
+            conn.send(batch)
+            batch = []
+            last_flush = now
+    if batch:
+        conn.send(batch)
+    conn.send((None, {"received": received, "malformed": malformed}))
+    conn.close()
+    sock.close()
+
+
+def to_dict(values):
+    return dict(zip(FIELD_NAMES.get(values[2], HEADER_NAMES), values))
+
+
+class Ingest:
+    """
+    Start receiver processes and aggregate their records in this process.
+
+    ports: list of ports.  With one port and processes > 1 the receivers
+        share it through SO_REUSEPORT, otherwise there is one receiver
+        per port.  Several ports with processes > 1 is a ValueError.
+    handler: called with every record dict (None to only count)
+    """
+
+    def __init__(self, ip="127.0.0.1", ports=(2237,), processes=1, handler=None):
+        self.ip = ip
+        self.ports = list(ports)
+        if len(self.ports) > 1 and processes > 1:
+            raise ValueError("use either several ports or several processes on one port")
+        if len(self.ports) == 1 and processes > 1:
+            self.bindings = [(self.ports[0], True)] * processes
+        else:
+            self.bindings = [(port, False) for port in self.ports]
+        self.handler = handler
+        self.records = 0
+        self.counts = {}
+        self.worker_stats = []
+        self._stop = multiprocessing.Event()
+        self._procs = []
+        self._conns = []
+
+    def start(self):
+        for port, reuse_port in self.bindings:
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            proc = multiprocessing.Process(
+                target=receiver,
+                args=(child_conn, self._stop, self.ip, port, reuse_port),
+                daemon=True,
+            )
+            proc.start()
+            child_conn.close()
+            self._procs.append(proc)
+            self._conns.append(parent_conn)
+        # Give the receivers a moment to bind before traffic arrives
+        time.sleep(0.2)
+
+    def _consume(self, conn):
+        message = conn.recv()
+        if isinstance(message, tuple) and message[0] is None:
+            self.worker_stats.append(message[1])
+            return False
+        self.records += len(message)
+        for values in message:
+            self.counts[values[2]] = self.counts.get(values[2], 0) + 1
+            if self.handler is not None:
+                self.handler(to_dict(values))
+        return True
+
+    def poll(self, timeout=0.1):
+        """
+        Process whatever batches are waiting, for up to timeout seconds.
+        """
+        for conn in multiprocessing.connection.wait(self._conns, timeout):
+            self._consume(conn)
+
+    def stop(self):
+        self._stop.set()
+        open_conns = list(self._conns)
+        while open_conns:
+            for conn in multiprocessing.connection.wait(open_conns, 1.0):
+                try:
+                    still_open = self._consume(conn)
+                except EOFError:
+                    still_open = False
+                if not still_open:
+                    open_conns.remove(conn)
+        for proc in self._procs:
+            proc.join(1.0)
+
+    def run_forever(self, stats_every=10):
+        self.start()
+        last = time.monotonic()
+        try:
+            while True:
+                self.poll()
+                if time.monotonic() - last > stats_every:
+                    last = time.monotonic()
+                    print(f"records={self.records} {self.counts}", file=sys.stderr)
+        finally:
+            self.stop()
+
+
+def load_generator(ip="127.0.0.1", ports=(2237,), seconds=5.0, senders=8, packets=None):
+    """
+    Blast packets at ip over all ports from several source sockets, so that
+    SO_REUSEPORT hashing spreads them over the receivers.  Returns the number
+    of datagrams sent.
+    """
+    if packets is None:
+        from bench_decode import CONTEST_MIX as packets
+
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(senders)]
+    targets = [(ip, port) for port in ports]
+    sent = 0
+    stop_at = time.monotonic() + seconds
+    while time.monotonic() < stop_at:
+        for sock in socks:
+            for target in targets:
+                for packet in packets:
+                    sock.sendto(packet, target)
+                    sent += 1
+    for sock in socks:
+        sock.close()
+    return sent
+
+
+def _load_process(ip, ports, seconds, senders, result):
+    result.put(load_generator(ip, ports, seconds, senders))
+
+
+def bench(ip, port, processes_list, seconds, senders, generators):
+    print(f"{'processes':>9} {'sent':>10} {'decoded':>10} {'decoded/s':>12}")
+    for processes in processes_list:
+        ingest = Ingest(ip, [port], processes)
+        ingest.start()
+        result = multiprocessing.Queue()
+        loaders = [
+            multiprocessing.Process(
+                target=_load_process, args=(ip, [port], seconds, senders, result)
+            )
+            for _ in range(generators)
+        ]
+        start = time.monotonic()
+        for proc in loaders:
+            proc.start()
+        while any(proc.is_alive() for proc in loaders):
+            ingest.poll()
+        ingest.stop()
+        elapsed = time.monotonic() - start
+        sent = sum(result.get() for _ in loaders)
+        print(
+            f"{processes:>9} {sent:>10,} {ingest.records:>10,} "
+            f"{ingest.records / elapsed:>12,.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["listen", "loadgen", "bench"])
+    parser.add_argument("--ip", default=func_parse.UDP_IP)
+    parser.add_argument(
+        "--ports",
+        type=int,
+        nargs="+",
+        default=[func_parse.UDP_PORT],
+        help="one receiver per port; several ports cannot be combined with --processes",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        nargs="+",
+        default=[1],
+        help="receivers sharing a single port (listen), or the counts to compare (bench)",
+    )
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--senders", type=int, default=8)
+    parser.add_argument("--generators", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.command == "listen":
+        if len(args.ports) > 1 and args.processes[0] > 1:
+            parser.error("--processes > 1 needs a single --ports value")
+        Ingest(args.ip, args.ports, args.processes[0], handler=print).run_forever()
+    elif args.command == "loadgen":
+        sent = load_generator(args.ip, args.ports, args.seconds, args.senders)
+        print(f"sent {sent:,} datagrams ({sent / args.seconds:,.0f}/s)")
+    else:
+        bench(
+            args.ip,
+            args.ports[0],
+            args.processes,
+            args.seconds,
+            args.senders,
+            args.generators,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#! /usr/bin/env python
+"""
+Low overhead instrumentation for the ingest pipeline.
+
+Histogram is an HDR style log-linear latency histogram: values (ns) land in
+one of SUB_BUCKETS linear buckets within their power of two, so recording
+is a couple of integer ops and percentiles are good to ~3%.  Metrics holds
+named histograms and counters and produces snapshots.
+
+Nothing here costs anything unless it is switched on: Listener only takes
+its instrumented code paths when given a Metrics instance.
+
+    metrics = Metrics()
+    serve_http(metrics, port=9237)       # curl localhost:9237/metrics
+    listener = Listener(
+        instrumented_decoder(metrics), handler=writer.put, metrics=metrics
+    )
+
+Stages recorded by the listener:
+    receive       time spent in datagram_received
+    queue_wait    receive to dequeue by a decoder worker
+    header        header unpack
+    decode.<type> field decoding per packet type
+    sink          handler call
+plus packets.<type>, bytes.<type>, malformed and errors counters.
+
+    python scripts/instrument.py bench     # measure instrumentation overhead
+    python scripts/instrument.py listen    # instrumented listener + endpoint
+"""
+
+import http.server
+import json
+import sys
+import threading
+import time
+
+import func_parse
+
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 48  # ~3 days in ns
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative integer values (ns).
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        # Only the upper half of the sub buckets is used above the first
+        # power of two, which keeps the index a shift and an add
+        self.counts = [0] * ((MAX_EXPONENT + 1) * SUB_BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        if value < SUB_BUCKETS:
+            index = max(value, 0)
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS
+            if shift > MAX_EXPONENT:
+                index = len(self.counts) - 1
+            else:
+                index = shift * SUB_BUCKETS + (value >> shift)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @staticmethod
+    def _bucket_value(index):
+        """
+        Upper edge of a bucket, in the units recorded.
+        """
+        shift, sub = divmod(index, SUB_BUCKETS)
+        if shift == 0:
+            return sub
+        return ((sub + 1) << shift) - 1
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = self.count * p / 100.0
+        running = 0
+        for index, n in enumerate(self.counts):
+            running += n
+            if n and running >= target:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def summary(self, scale=1e-3):
+        """
+        count, mean, max and percentiles, scaled (default ns -> µs).
+        """
+        out = {
+            "count": self.count,
+            "mean": self.total / self.count * scale if self.count else 0.0,
+            "max": self.max * scale,
+        }
+        for p in PERCENTILES:
+            out[f"p{p:g}"] = self.percentile(p) * scale
+        return out
+
+
+class Metrics:
+    """
+    Named histograms and counters.  Not locked: increments from several
+    threads can occasionally be lost, which is fine for monitoring and keeps
+    the hot path cheap.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.started_at = time.monotonic()
+
+    def observe(self, name, ns):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(ns)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self, reset=False):
+        """
+        Dict of counters and histogram summaries (µs).  With reset=True the
+        metrics restart, so periodic snapshots cover one interval each.
+        """
+        now = time.monotonic()
+        histograms, counters = self.histograms, self.counters
+        snapshot = {
+            "interval_seconds": now - self.started_at,
+            "counters": dict(counters),
+            "latency_us": {name: h.summary() for name, h in list(histograms.items())},
+        }
+        if reset:
+            self.histograms = {}
+            self.counters = {}
+            self.started_at = now
+        return snapshot
+
+    def to_text(self):
+        """
+        Plain text rendering, one metric per line.
+        """
+        snapshot = self.snapshot()
+        lines = [f"interval_seconds {snapshot['interval_seconds']:.3f}"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name} {value}")
+        for name, summary in sorted(snapshot["latency_us"].items()):
+            for key, value in summary.items():
+                lines.append(f"latency_us{{stage={name!r},stat={key!r}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# (packets counter, bytes counter, decode stage) names per packet type
+_NAMES = {
+    packet_type: (f"packets.{packet_type}", f"bytes.{packet_type}", f"decode.{packet_type}")
+    for packet_type in [*func_parse.PACKET_TYPES.values(), "unknown"]
+}
+
+
+def decode_instrumented(data, metrics, received_at=None):
+    """
+    func_parse.decode() that records header/field timings and counters.
+    """
+    perf_counter_ns = time.perf_counter_ns
+    start = perf_counter_ns()
+    view = memoryview(data)
+    try:
+        magic, schema, packet_type_index = func_parse.check_header(view)
+    except Exception:
+        metrics.count("malformed")
+        raise
+    dispatch = func_parse.DISPATCH
+    if 0 <= packet_type_index < len(dispatch):
+        packet_type, steps = dispatch[packet_type_index]
+    else:
+        packet_type, steps = func_parse.UNKNOWN
+    rec = {"magic": magic, "schema": schema, "packet_type": packet_type}
+    header_done = perf_counter_ns()
+    packets_name, bytes_name, decode_name = _NAMES[packet_type]
+    counters = metrics.counters
+    counters[packets_name] = counters.get(packets_name, 0) + 1
+    counters[bytes_name] = counters.get(bytes_name, 0) + len(view)
+
+    if steps is not None:
+        try:
+            func_parse.decode_fields(steps, rec, view, func_parse.HEADER.size, received_at)
+        except Exception:
+            metrics.count("malformed")
+            raise
+        metrics.observe(decode_name, perf_counter_ns() - header_done)
+    metrics.observe("header", header_done - start)
+    return rec
+
+
+def instrumented_decoder(metrics):
+    """
+    Decoder for Listener that splits decode time into header and per-type
+    stages.
+    """
+    return lambda data: decode_instrumented(data, metrics)
+
+
+def serve_http(metrics, ip="127.0.0.1", port=9237):
+    """
+    Serve /metrics (text) and /metrics.json from a daemon thread.
+    Returns the server; call shutdown() to stop it.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics.json":
+                body = json.dumps(metrics.snapshot()).encode()
+                content_type = "application/json"
+            elif self.path in ("/", "/metrics"):
+                body = metrics.to_text().encode()
+                content_type = "text/plain; charset=utf-8"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((ip, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def bench(number=200_000):
+    """
+    Compare plain decode() with decode_instrumented() on the benchmark mix.
+    """
+    from bench_decode import CONTEST_MIX
+
+    packets = CONTEST_MIX * max(1, number // len(CONTEST_MIX))
+    metrics = Metrics()
+
+    start = time.perf_counter()
+    for packet in packets:
+        func_parse.decode(packet)
+    plain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for packet in packets:
+        decode_instrumented(packet, metrics)
+    instrumented = time.perf_counter() - start
+
+    n = len(packets)
+    print(f"disabled     {n / plain:>12,.0f} packets/s")
+    print(f"instrumented {n / instrumented:>12,.0f} packets/s")
+    print(f"overhead     {1e9 * (instrumented - plain) / n:>12,.0f} ns/packet")
+    print(json.dumps(metrics.snapshot()["latency_us"], indent=2))
+
+
+def listen(port=2237, http_port=9237):
+    import asyncio
+    from listener import Listener
+
+    metrics = Metrics()
+    serve_http(metrics, port=http_port)
+    listener = Listener(
+        instrumented_decoder(metrics), handler=lambda rec: None, port=port, metrics=metrics
+    )
+    print(f"metrics on http://127.0.0.1:{http_port}/metrics", file=sys.stderr)
+    try:
+        asyncio.run(listener.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    command, args = sys.argv[1:2], [int(arg) for arg in sys.argv[2:]]
+    if command == ["bench"]:
+        bench(*args)
+    elif command == ["listen"]:
+        listen(*args)
+    else:
+        print(__doc__)
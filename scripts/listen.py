@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+"""
+Command line listener: print every decoded WSJT-X datagram.
+
+    python scripts/listen.py
+    python scripts/listen.py --ip 0.0.0.0 --port 2237 --workers 4 --stats-every 10
+
+func_parse and listener are libraries and do nothing on import; this is
+the only place the socket gets bound.
+"""
+
+import argparse
+import asyncio
+
+import func_parse
+from listener import Listener
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print decoded WSJT-X datagrams")
+    parser.add_argument("--ip", default=func_parse.UDP_IP)
+    parser.add_argument("--port", type=int, default=func_parse.UDP_PORT)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--stats-every", type=float, default=60, help="seconds between stats on stderr, 0 for none"
+    )
+    args = parser.parse_args(argv)
+
+    listener = Listener(
+        func_parse.decode, handler=print, ip=args.ip, port=args.port, workers=args.workers
+    )
+    try:
+        asyncio.run(listener.serve_forever(stats_every=args.stats_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
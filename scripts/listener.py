@@ -0,0 +1,249 @@
+"""
+asyncio UDP listener for WSJT-X datagrams.
+
+The receive side never waits on anything downstream.  Datagrams are stamped
+and pushed into a bounded ring; when the ring is full the oldest datagram is
+dropped and counted.  A pool of decoder worker threads drains the ring,
+decodes and hands each record to a handler, so a slow handler (printing,
+writing to disk) only grows the queue instead of stalling the socket.
+
+    import asyncio
+    from func_parse import decode
+    from listener import Listener
+
+    listener = Listener(decode, handler=print, workers=2)
+    asyncio.run(listener.serve_forever(stats_every=10))
+"""
+
+import asyncio
+import collections
+import sys
+import threading
+import time
+
+
+class RingQueue:
+    """
+    Thread safe bounded FIFO that drops the oldest item instead of blocking.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._items = collections.deque(maxlen=maxsize)
+        self._not_empty = threading.Condition(threading.Lock())
+        self._closed = False
+        self.dropped = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """
+        Add an item without blocking.  Returns False if an old item was
+        dropped to make room.
+        """
+        with self._not_empty:
+            full = len(self._items) == self.maxsize
+            if full:
+                self.dropped += 1
+            self._items.append(item)
+            depth = len(self._items)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._not_empty.notify()
+        return not full
+
+    def get(self, timeout=None):
+        """
+        Return the oldest item, or None once the queue is closed and empty.
+        """
+        with self._not_empty:
+            while not self._items:
+                if self._closed:
+                    return None
+                if not self._not_empty.wait(timeout):
+                    return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify_all()
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, listener):
+        self.listener = listener
+
+    def datagram_received(self, data, addr):
+        listener = self.listener
+        listener.received += 1
+        received_at = time.time()
+        if listener.on_raw is not None:
+            # Here rather than on a worker, so it sees datagrams in receive order
+            try:
+                listener.on_raw(data, received_at)
+            except Exception as e:
+                listener._count_error(e, addr)
+        listener.queue.put((received_at, data, addr))
+
+    def error_received(self, exc):
+        self.listener.socket_errors += 1
+
+
+class _InstrumentedProtocol(_Protocol):
+    def datagram_received(self, data, addr):
+        start = time.perf_counter_ns()
+        super().datagram_received(data, addr)
+        self.listener.metrics.observe("receive", time.perf_counter_ns() - start)
+
+
+class Listener:
+    """
+    Receive WSJT-X datagrams on ip:port and decode them on worker threads.
+
+    decoder: callable turning raw bytes into a record (e.g. func_parse.decode)
+    handler: called as handler(rec) on a worker thread for every record
+    workers: number of decoder threads
+    maxsize: ring capacity in datagrams
+    on_raw: optional on_raw(data, received_at) called for every datagram
+        on the event loop, in receive order and before it is queued, e.g.
+        capture.CaptureWriter.write (which needs time ordered records).
+        It must be quick, it holds up the receive side.
+    metrics: optional instrument.Metrics.  When set, receive, queue wait,
+        decode and sink latencies are recorded; when None the
+        uninstrumented code paths are used.
+    """
+
+    def __init__(
+        self,
+        decoder,
+        handler=print,
+        ip="127.0.0.1",
+        port=2237,
+        workers=2,
+        maxsize=4096,
+        on_raw=None,
+        metrics=None,
+    ):
+        self.decoder = decoder
+        self.handler = handler
+        self.on_raw = on_raw
+        self.metrics = metrics
+        self.ip = ip
+        self.port = port
+        self.queue = RingQueue(maxsize)
+        self.received = 0
+        self.decoded = 0
+        self.errors = 0
+        self.errors_by_type = collections.Counter()
+        self.socket_errors = 0
+        self._num_workers = workers
+        self._threads = []
+        self._transport = None
+        self._count_lock = threading.Lock()
+
+    def stats(self):
+        """
+        Snapshot of the receive, drop and decode counters.
+        """
+        received = self.received
+        dropped = self.queue.dropped
+        return {
+            "received": received,
+            "dropped": dropped,
+            "decoded": self.decoded,
+            "errors": self.errors,
+            "errors_by_type": dict(self.errors_by_type),
+            "socket_errors": self.socket_errors,
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.queue.max_depth,
+            "drop_rate": dropped / received if received else 0.0,
+        }
+
+    def _count_error(self, error, addr):
+        """
+        Count a failed datagram.  Only the first error of each type is
+        printed so a misbehaving sender cannot flood stderr.
+        """
+        name = type(error).__name__
+        with self._count_lock:
+            self.errors += 1
+            self.errors_by_type[name] += 1
+            first = self.errors_by_type[name] == 1
+        if first:
+            print(f"{name} from {addr}: {error} (further {name}s are only counted)", file=sys.stderr)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            received_at, data, addr = item
+            try:
+                rec = self.decoder(data)
+                self.handler(rec)
+            except Exception as e:
+                self._count_error(e, addr)
+            else:
+                with self._count_lock:
+                    self.decoded += 1
+
+    def _work_instrumented(self):
+        metrics = self.metrics
+        perf_counter_ns = time.perf_counter_ns
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            received_at, data, addr = item
+            start = perf_counter_ns()
+            metrics.observe("queue_wait", int((time.time() - received_at) * 1e9))
+            try:
+                rec = self.decoder(data)
+                decoded = perf_counter_ns()
+                metrics.observe("decode", decoded - start)
+                self.handler(rec)
+                metrics.observe("sink", perf_counter_ns() - decoded)
+            except Exception as e:
+                metrics.count("errors")
+                self._count_error(e, addr)
+            else:
+                with self._count_lock:
+                    self.decoded += 1
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        protocol = _Protocol if self.metrics is None else _InstrumentedProtocol
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: protocol(self), local_addr=(self.ip, self.port)
+        )
+        work = self._work if self.metrics is None else self._work_instrumented
+        for nn in range(self._num_workers):
+            thread = threading.Thread(
+                target=work, name=f"decoder-{nn}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self, timeout=1.0):
+        if self._transport is not None:
+            self._transport.close()
+        self.queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    async def serve_forever(self, stats_every=None):
+        """
+        Start listening and run until cancelled, optionally printing
+        stats() to stderr every stats_every seconds.
+        """
+        await self.start()
+        try:
+            while True:
+                await asyncio.sleep(stats_every or 3600)
+                if stats_every:
+                    print(self.stats(), file=sys.stderr)
+        finally:
+            self.close()
@@ -0,0 +1,264 @@
+#! /usr/bin/env python
+"""
+Per-client session state for WSJT-X instances.
+
+Each instance (keyed by its packet_id) sends a Status with every field
+whenever anything changes, and most of those fields repeat from one Status
+to the next.  SessionTracker keeps the last Status of every client and turns
+each new one into a compact delta event holding only the changed fields.
+Heartbeats keep the client alive: a client whose last Heartbeat is older
+than stale_after seconds is reported stale once, and alive again when it
+comes back.
+
+Events are dicts:
+    {"event": "connect", "packet_id", "at"}                   first packet seen
+    {"event": "status", "packet_id", "at", "changed": {...}}   changed fields only
+    {"event": "stale", "packet_id", "at"}
+    {"event": "alive", "packet_id", "at"}
+    {"event": "close", "packet_id", "at"}
+
+    tracker = SessionTracker(on_event=print)
+    listener = Listener(decode, handler=tracker)
+    ...
+    tracker.status("WSJT-X")["dial_frequency"]
+
+or from the command line
+
+    python scripts/sessions.py
+"""
+
+import argparse
+import datetime
+import threading
+import time
+
+import func_parse
+
+# WSJT-X sends a Heartbeat every 15 s
+HEARTBEAT_INTERVAL = 15.0
+
+STATUS_FIELDS = tuple(name for name, _ in func_parse.SCHEMAS["status"] if name != "packet_id")
+
+
+class ClientState:
+    """
+    What is known about one client.  status is the latest full Status
+    (without header fields), None until the first one arrives.
+    """
+
+    __slots__ = (
+        "packet_id",
+        "status",
+        "version",
+        "max_schema_number",
+        "last_heartbeat",
+        "last_seen",
+        "stale",
+        "raw_status",
+    )
+
+    def __init__(self, packet_id, now):
+        self.packet_id = packet_id
+        self.status = None
+        self.version = None
+        self.max_schema_number = None
+        self.last_heartbeat = now
+        self.last_seen = now
+        self.stale = False
+        self.raw_status = None
+
+    def __repr__(self):
+        state = "stale" if self.stale else "alive"
+        return f"<ClientState {self.packet_id} {state} version={self.version}>"
+
+
+class SessionTracker:
+    """
+    Track client sessions from decoded records and emit delta events.
+
+    Call it with every record from decode() (it is a Listener handler); it
+    returns the list of events the record produced and also passes each
+    to on_event.  Time is the record's "received_at" (a naive UTC datetime,
+    as added by CaptureReader.decode()) or wall clock time.
+
+    stale_after: seconds without a Heartbeat before a client is stale
+        (default three missed heartbeats)
+    on_event: optional callable for every event
+    """
+
+    def __init__(self, stale_after=3 * HEARTBEAT_INTERVAL, on_event=None):
+        self.stale_after = stale_after
+        self.on_event = on_event
+        self.clients = {}
+        self.status_messages = 0
+        self.status_events = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.clients)
+
+    def get(self, packet_id):
+        """
+        ClientState for packet_id, or None.
+        """
+        return self.clients.get(packet_id)
+
+    def status(self, packet_id):
+        """
+        Latest full Status dict of packet_id, or None.
+        """
+        client = self.clients.get(packet_id)
+        return None if client is None else client.status
+
+    def _emit(self, events, event, client, now, changed=None):
+        out = {"event": event, "packet_id": client.packet_id, "at": now}
+        if changed is not None:
+            out["changed"] = changed
+        events.append(out)
+
+    def _client(self, events, packet_id, now):
+        client = self.clients.get(packet_id)
+        if client is None:
+            client = self.clients[packet_id] = ClientState(packet_id, now)
+            self._emit(events, "connect", client, now)
+        return client
+
+    def _update_status(self, events, client, rec, now):
+        self.status_messages += 1
+        previous = client.status
+        if previous is None:
+            changed = {name: rec[name] for name in STATUS_FIELDS}
+        else:
+            changed = {name: rec[name] for name in STATUS_FIELDS if rec[name] != previous[name]}
+        if previous is None or changed:
+            client.status = {name: rec[name] for name in STATUS_FIELDS}
+        if changed:
+            self.status_events += 1
+            self._emit(events, "status", client, now, changed)
+
+    def __call__(self, rec):
+        return self._track(rec)
+
+    def _track(self, rec, raw_status=None):
+        """
+        Apply one record.  raw_status is the datagram of a Status, stored
+        with it under the lock so feed() can skip exact repeats.
+        """
+        packet_type = rec.get("packet_type")
+        if packet_type not in ("heartbeat", "status", "close"):
+            return []
+        received_at = rec.get("received_at")
+        if received_at is None:
+            now = time.time()
+        else:
+            now = received_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+        events = []
+        with self._lock:
+            client = self._client(events, rec["packet_id"], now)
+            client.last_seen = now
+            if packet_type == "heartbeat":
+                client.last_heartbeat = now
+                client.version = rec["version"]
+                client.max_schema_number = rec["max_schema_number"]
+                if client.stale:
+                    client.stale = False
+                    self._emit(events, "alive", client, now)
+            elif packet_type == "status":
+                self._update_status(events, client, rec, now)
+                client.raw_status = raw_status
+            else:
+                del self.clients[client.packet_id]
+                self._emit(events, "close", client, now)
+            self._expire(events, now)
+        self._dispatch(events)
+        return events
+
+    def feed(self, data, received_at=None):
+        """
+        Raw datagram entry point.  received_at is epoch seconds, as for
+        decode() (default wall clock).  A Status that is byte for byte the
+        same as the previous one from its client is dropped without
+        decoding.  Safe to call from several threads, and a Status racing
+        a Close of its client is simply decoded as a new connection.
+        """
+        view = func_parse.PacketView(data, received_at)
+        if view.packet_type not in ("heartbeat", "status", "close"):
+            return []
+        raw_status = None
+        if view.packet_type == "status":
+            raw_status = bytes(data)
+            with self._lock:
+                client = self.clients.get(view.packet_id)
+                if client is not None and client.raw_status == raw_status:
+                    self.status_messages += 1
+                    client.last_seen = time.time() if received_at is None else received_at
+                    return []
+        rec = func_parse.decode(data, received_at)
+        if received_at is not None:
+            rec["received_at"] = datetime.datetime.fromtimestamp(
+                received_at, datetime.timezone.utc
+            ).replace(tzinfo=None)
+        return self._track(rec, raw_status)
+
+    def _expire(self, events, now):
+        stale_after = self.stale_after
+        for client in self.clients.values():
+            if not client.stale and now - client.last_heartbeat > stale_after:
+                client.stale = True
+                self._emit(events, "stale", client, now)
+
+    def expire(self, now=None):
+        """
+        Mark clients stale whose Heartbeat is overdue.  Only needed when
+        traffic stops altogether; every record also runs the check.
+        """
+        events = []
+        with self._lock:
+            self._expire(events, time.time() if now is None else now)
+        self._dispatch(events)
+        return events
+
+    def _dispatch(self, events):
+        if self.on_event is not None:
+            for event in events:
+                self.on_event(event)
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "stale": sum(client.stale for client in self.clients.values()),
+            "status_messages": self.status_messages,
+            "status_events": self.status_events,
+        }
+
+
+def main():
+    import asyncio
+    from func_parse import decode
+    from listener import Listener
+
+    parser = argparse.ArgumentParser(description="Print WSJT-X client session changes")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2237)
+    parser.add_argument("--stale-after", type=float, default=3 * HEARTBEAT_INTERVAL)
+    args = parser.parse_args()
+
+    tracker = SessionTracker(args.stale_after, on_event=print)
+    listener = Listener(decode, handler=tracker, ip=args.ip, port=args.port)
+
+    async def run():
+        await listener.start()
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            tracker.expire()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    main()
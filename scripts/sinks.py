@@ -0,0 +1,309 @@
+#! /usr/bin/env python
+"""
+Batched output sinks for decoded WSJT-X records.
+
+BatchWriter takes records from the ingest hot path with a non-blocking
+put() and leaves all output I/O to a background thread.  The thread groups
+records by packet type and hands a batch to the sink when it reaches
+batch_size records or flush_interval seconds, whichever comes first.
+
+Sinks:
+    JsonLinesSink   newline delimited JSON, one file
+    SqliteSink      one table per packet type, executemany per transaction
+    ParquetSink     one file per packet type, one row group per batch
+                    (needs pyarrow)
+
+    writer = BatchWriter(SqliteSink("wsjtx.db"))
+    listener = Listener(decode, handler=writer.put)
+    ...
+    print(writer.stats())
+
+or from the command line
+
+    python scripts/sinks.py sqlite wsjtx.db
+"""
+
+import argparse
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from func_parse import time_tuple_to_timestamp
+
+
+def normalize(rec):
+    """
+    Flatten a decoded record for storage: (julian day, time, timespec)
+    tuples become a single datetime and colors a list.
+    """
+    out = {}
+    for key, value in rec.items():
+        if isinstance(value, tuple) and len(value) == 6:
+            value = list(value)
+        elif isinstance(value, tuple):
+            value = time_tuple_to_timestamp(value)
+        out[key] = value
+    return out
+
+
+class Sink:
+    """
+    Base class for sinks.  write_batch() is only ever called from the
+    BatchWriter thread.
+    """
+
+    def write_batch(self, packet_type, records):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(Sink):
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write_batch(self, packet_type, records):
+        self.file.write(
+            "".join(json.dumps(normalize(rec), default=str) + "\n" for rec in records)
+        )
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SqliteSink(Sink):
+    """
+    Writes each packet type to its own table, created from the keys of the
+    first record seen.  Each batch is one executemany in one transaction.
+    """
+
+    def __init__(self, path):
+        # The connection is created here but only used from the writer thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._inserts = {}
+
+    def _insert_sql(self, packet_type, columns):
+        sql = self._inserts.get(packet_type)
+        if sql is None:
+            column_list = ", ".join(f'"{c}"' for c in columns)
+            self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{packet_type}" ({column_list})')
+            placeholders = ", ".join("?" for _ in columns)
+            sql = self._inserts[packet_type] = (
+                f'INSERT INTO "{packet_type}" ({column_list}) VALUES ({placeholders})'
+            )
+        return sql
+
+    def write_batch(self, packet_type, records):
+        records = [normalize(rec) for rec in records]
+        columns = list(records[0])
+        sql = self._insert_sql(packet_type, columns)
+        rows = [
+            tuple(
+                v.isoformat(sep=" ") if isinstance(v, datetime.datetime) else v
+                for v in (rec.get(c) for c in columns)
+            )
+            for rec in records
+        ]
+        with self.conn:
+            self.conn.executemany(sql, rows)
+
+    def close(self):
+        self.conn.close()
+
+
+class ParquetSink(Sink):
+    """
+    Writes <directory>/<packet_type>.parquet with one row group per batch.
+    The schema of each file comes from its first batch.
+    """
+
+    def __init__(self, directory):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:
+            raise ImportError("ParquetSink needs pyarrow (pip install pyarrow)") from e
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._writers = {}
+
+    def write_batch(self, packet_type, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        records = [normalize(rec) for rec in records]
+        writer = self._writers.get(packet_type)
+        if writer is None:
+            table = pa.Table.from_pylist(records)
+            path = os.path.join(self.directory, f"{packet_type}.parquet")
+            writer = self._writers[packet_type] = pq.ParquetWriter(path, table.schema)
+        else:
+            table = pa.Table.from_pylist(records, schema=writer.schema)
+        writer.write_table(table)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+
+
+class BatchWriter:
+    """
+    Feed records to a sink in per-type batches from a background thread.
+
+    batch_size: flush a packet type once it has this many records
+    flush_interval: flush everything pending at least this often (seconds)
+    """
+
+    def __init__(self, sink, batch_size=1000, flush_interval=1.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._pending = {}
+        # put() runs on every Listener worker thread
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.by_type = {}
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, rec):
+        """
+        Queue a record.  Never blocks.
+        """
+        with self._lock:
+            self.queued += 1
+        self._queue.put(rec)
+
+    __call__ = put
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started_at
+        with self._lock:
+            queued = self.queued
+        return {
+            "queued": queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backlog": queued - self.written - self.dropped,
+            "records_per_second": self.written / elapsed if elapsed else 0.0,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "mean_flush_ms": 1000 * self._total_flush_latency / self.flushes
+            if self.flushes
+            else 0.0,
+            "last_flush_ms": 1000 * self.last_flush_latency,
+            "max_flush_ms": 1000 * self.max_flush_latency,
+            "by_type": dict(self.by_type),
+        }
+
+    def _flush(self, packet_type):
+        records = self._pending.pop(packet_type, None)
+        if not records:
+            return
+        start = time.perf_counter()
+        try:
+            self.sink.write_batch(packet_type, records)
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(records)
+            print(f"sink error writing {packet_type}: {e!r}", file=sys.stderr)
+        else:
+            self.written += len(records)
+            self.by_type[packet_type] = self.by_type.get(packet_type, 0) + len(records)
+        latency = time.perf_counter() - start
+        self.flushes += 1
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self._total_flush_latency += latency
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                rec = self._queue.get(timeout=max(0.0, next_flush - time.monotonic()))
+            except queue.Empty:
+                rec = None
+            if rec is _STOP:
+                break
+            if rec is not None:
+                packet_type = rec.get("packet_type", "unknown")
+                batch = self._pending.setdefault(packet_type, [])
+                batch.append(rec)
+                if len(batch) >= self.batch_size:
+                    self._flush(packet_type)
+            if time.monotonic() >= next_flush:
+                for packet_type in list(self._pending):
+                    self._flush(packet_type)
+                next_flush = time.monotonic() + self.flush_interval
+        for packet_type in list(self._pending):
+            self._flush(packet_type)
+
+    def close(self):
+        """
+        Flush everything queued so far and close the sink.
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.sink.close()
+
+
+_STOP = object()
+
+SINKS = {
+    "jsonl": JsonLinesSink,
+    "sqlite": SqliteSink,
+    "parquet": ParquetSink,
+}
+
+
+def main():
+    import asyncio
+    from func_parse import decode
+    from listener import Listener
+
+    parser = argparse.ArgumentParser(description="Write decoded WSJT-X packets to a sink")
+    parser.add_argument("format", choices=sorted(SINKS))
+    parser.add_argument("path", help="output file (jsonl, sqlite) or directory (parquet)")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2237)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    writer = BatchWriter(SINKS[args.format](args.path), args.batch_size, args.flush_interval)
+    listener = Listener(decode, handler=writer.put, ip=args.ip, port=args.port)
+
+    async def run():
+        await listener.start()
+        while True:
+            await asyncio.sleep(60)
+            print(listener.stats(), writer.stats(), file=sys.stderr)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#! /usr/bin/env python
+"""
+Streaming DX spot extraction from WSJT-X Decode messages.
+
+This is the spotting loop that used to live (commented out) at the bottom of
+func_parse.py, turned into a stage that sits after decode().  Status
+messages set the dial frequency and mode of each client, Decode messages are
+parsed for "CQ" / "DE" calls and every spot is deduplicated over a sliding
+time window instead of a list that is cleared every three minutes.
+
+    python scripts/spots.py --rx-call N0CALL
+
+or, as a listener handler,
+
+    extractor = SpotExtractor()
+    listener = Listener(decode, handler=extractor.print_spots)
+"""
+
+import argparse
+import collections
+import datetime
+import math
+import threading
+import time
+
+# Amateur bands as (low MHz, high MHz, name)
+BANDS = [
+    (1.8, 2.0, "160m"),
+    (3.5, 4.0, "80m"),
+    (5.3, 5.41, "60m"),
+    (7.0, 7.3, "40m"),
+    (10.1, 10.15, "30m"),
+    (14.0, 14.35, "20m"),
+    (18.068, 18.168, "17m"),
+    (21.0, 21.45, "15m"),
+    (24.89, 24.99, "12m"),
+    (28.0, 29.7, "10m"),
+    (50.0, 54.0, "6m"),
+    (144.0, 148.0, "2m"),
+]
+
+Spot = collections.namedtuple(
+    "Spot", "dx frequency snr mode mode_type utc band packet_id"
+)
+
+
+def band_for(frequency_hz):
+    mhz = frequency_hz / 1e6
+    for low, high, name in BANDS:
+        if low <= mhz <= high:
+            return name
+    return "unknown"
+
+
+def parse_message(message):
+    """
+    Return (dx call, "CQ" or "DE") for a spottable FT8 message, else None.
+    """
+    msg = message.split()
+    if len(msg) > 2:
+        if msg[0] == "CQ":  # "CQ OX6X KP03"
+            if len(msg[1]) < 3:  # "CQ DX/EU/NA/AS OX6X"
+                return msg[2], "CQ"
+            return msg[1], "CQ"
+        if len(msg[1]) > 2:
+            return msg[1], "DE"
+        return None  # "73 DE OX6X"
+    if len(msg) == 2 and ("/" in msg[0] or "/" in msg[1]):
+        # "SX3X OZ/OX6X" or "OZ/OX6X SX3X"
+        if len(msg[1]) > 2:  # "OX6X/QRP 73"
+            return msg[1], "DE"
+    return None
+
+
+def format_spot(spot, rx_call="N0CALL"):
+    return "{} {:<10}{:8.1f}  {:<14} {:<5}{:3} dB  {:8}{:8}{:4}Z".format(
+        "DX de",
+        (rx_call + "-#")[:8] + ":",
+        spot.frequency,
+        spot.dx,
+        spot.mode,
+        spot.snr,
+        "",
+        spot.mode_type,
+        spot.utc,
+    )
+
+
+class SlidingDeduper:
+    """
+    Remembers keys for a sliding time window.
+
+    Keys are (call, band, mode).  The window for a key comes from windows,
+    a dict keyed by (band, mode), (band, None) or (None, mode), falling back
+    to default_window.  Last-seen times live in a dict for O(1) lookups and
+    keys are also filed in time buckets of bucket_seconds, so expiry only
+    visits buckets that have aged out.  When more than max_entries keys are
+    live the oldest buckets are evicted early to keep memory bounded.
+    """
+
+    def __init__(
+        self, default_window=180.0, windows=None, bucket_seconds=15.0, max_entries=100_000
+    ):
+        self.default_window = default_window
+        self.windows = dict(windows or {})
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+        self.max_window = max([default_window, *self.windows.values()])
+        self.evicted = 0
+        self._last_seen = {}
+        self._buckets = collections.deque()
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def window_for(self, band, mode):
+        windows = self.windows
+        for key in ((band, mode), (band, None), (None, mode)):
+            if key in windows:
+                return windows[key]
+        return self.default_window
+
+    def _expire(self, now):
+        buckets = self._buckets
+        horizon = math.floor((now - self.max_window) / self.bucket_seconds)
+        while buckets and (
+            buckets[0][0] < horizon or len(self._last_seen) >= self.max_entries
+        ):
+            bucket_index, keys = buckets.popleft()
+            early = bucket_index >= horizon
+            for key in keys:
+                seen = self._last_seen.get(key)
+                # Only drop keys whose latest sighting is in this bucket
+                if seen is not None and math.floor(seen / self.bucket_seconds) == bucket_index:
+                    del self._last_seen[key]
+                    self.evicted += early
+
+    def is_new(self, key, now):
+        """
+        True (and remember key) unless key was accepted within its window.
+        """
+        self._expire(now)
+        seen = self._last_seen.get(key)
+        if seen is not None and now - seen < self.window_for(key[1], key[2]):
+            return False
+        self._last_seen[key] = now
+        bucket_index = math.floor(now / self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != bucket_index:
+            self._buckets.append((bucket_index, set()))
+        self._buckets[-1][1].add(key)
+        return True
+
+
+class SpotExtractor:
+    """
+    Turn decoded records into deduplicated spots.
+
+    Call it with every record from decode(); it returns a Spot for new
+    spots and None otherwise.  Time for the dedup window is the record's
+    "received_at" (capture replays) or wall clock time.
+    """
+
+    def __init__(self, deduper=None, rx_call="N0CALL"):
+        self.deduper = SlidingDeduper() if deduper is None else deduper
+        self.rx_call = rx_call
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, rec):
+        packet_type = rec.get("packet_type")
+        if packet_type == "status":
+            with self._lock:
+                self._clients[rec["packet_id"]] = (rec["dial_frequency"], rec["mode"])
+            return None
+        if packet_type != "decode":
+            return None
+
+        client = self._clients.get(rec["packet_id"])
+        if client is None:
+            return None
+        dial_frequency, mode = client
+
+        parsed = parse_message(rec["message"])
+        if parsed is None:
+            return None
+        dx, mode_type = parsed
+
+        received_at = rec.get("received_at")
+        now = (
+            received_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+            if received_at is not None
+            else time.time()
+        )
+        band = band_for(dial_frequency)
+        with self._lock:
+            if not self.deduper.is_new((dx, band, mode), now):
+                return None
+
+        return Spot(
+            dx=dx,
+            frequency=(dial_frequency + rec["delta_frequency"]) / 1000,
+            snr=rec["snr"],
+            mode=mode,
+            mode_type=mode_type,
+            utc=rec["time"].strftime("%H%M"),
+            band=band,
+            packet_id=rec["packet_id"],
+        )
+
+    def print_spots(self, rec):
+        spot = self(rec)
+        if spot is not None:
+            print(format_spot(spot, self.rx_call))
+
+
+def main():
+    import asyncio
+    from func_parse import decode
+    from listener import Listener
+
+    parser = argparse.ArgumentParser(description="Print DX spots from WSJT-X")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2237)
+    parser.add_argument("--rx-call", default="N0CALL")
+    parser.add_argument("--window", type=float, default=180.0)
+    args = parser.parse_args()
+
+    extractor = SpotExtractor(SlidingDeduper(args.window), rx_call=args.rx_call)
+    listener = Listener(decode, handler=extractor.print_spots, ip=args.ip, port=args.port)
+    try:
+        asyncio.run(listener.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
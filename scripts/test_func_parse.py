@@ -0,0 +1,114 @@
+import struct
+
+import pandas as pd
+import pytest
+
+import func_parse
+
+RECEIVED_AT = 1_700_000_000.0
+
+# One value per field type, in the form encode() takes
+SAMPLE_VALUES = {
+    "utf8": "K1ABC",
+    "int8": -3,
+    "uint8": 7,
+    "bool": True,
+    "int32": -1200,
+    "unsigned32": 14074000,
+    "int64": 14074000,
+    "uint64": 2**40,
+    "double": 0.25,
+    "time": 45_000_000,
+    "datetime": (2460000, 45_000_000, 1),
+    "color": (1, 65535, 256, 512, 1024, 0),
+}
+
+
+def sample(schema, **values):
+    """
+    A record for schema.  Strings are the field name, so a field read from
+    the wrong offset shows.
+    """
+    rec = {
+        name: name if field_type == "utf8" else SAMPLE_VALUES[field_type]
+        for name, field_type in schema
+    }
+    rec.update(values)
+    return rec
+
+
+def comparable(field_type, value):
+    """
+    A decoded value in the form encode() takes.
+    """
+    if field_type == "time":
+        return func_parse.time_of_day_ms(value)
+    if field_type == "datetime":
+        date_val, time_val, timespec = value
+        return (date_val, func_parse.time_of_day_ms(time_val), timespec)
+    if field_type == "color":
+        return tuple(value)
+    return value
+
+
+def qso_packet(timespec):
+    """
+    A QSO Logged datagram whose time_tuple_off has timespec, laid out as Qt
+    does: an int32 offset from UTC follows timespec 2.
+    """
+    rec = sample(func_parse.SCHEMAS["qso"], time_tuple_off=(2460000, 45_000_000, 1))
+    data = bytearray(func_parse.encode("qso", rec))
+    position = func_parse.HEADER.size + 4 + len(rec["packet_id"]) + 12
+    data[position] = timespec
+    if timespec == 2:
+        data[position + 1 : position + 1] = struct.pack(">i", 3600)
+    return bytes(data)
+
+
+@pytest.mark.parametrize("timespec", [0, 1])
+def test_datetime_fixed_timespecs(timespec):
+    data = qso_packet(timespec)
+    date_val, time_val, decoded_spec = func_parse.decode(data, RECEIVED_AT)["time_tuple_off"]
+    assert (date_val, func_parse.time_of_day_ms(time_val), decoded_spec) == (
+        2460000,
+        45_000_000,
+        timespec,
+    )
+    assert func_parse.PacketView(data, RECEIVED_AT).time_tuple_off[2] == timespec
+    assert len(func_parse.decode_many([data], [RECEIVED_AT])["qso"]) == 1
+
+
+@pytest.mark.parametrize("timespec", [2, 3])
+def test_datetime_other_timespecs_raise(timespec):
+    data = qso_packet(timespec)
+    with pytest.raises(func_parse.BadDateTime):
+        func_parse.decode(data, RECEIVED_AT)
+    with pytest.raises(func_parse.BadDateTime):
+        func_parse.PacketView(data, RECEIVED_AT).time_tuple_off
+    assert len(func_parse.decode_many([data], [RECEIVED_AT])["qso"]) == 0
+    with pytest.raises(ValueError):
+        func_parse.encode("qso", sample(func_parse.SCHEMAS["qso"], time_tuple_on=(0, 0, timespec)))
+
+
+@pytest.mark.parametrize("type_id, packet_type, schema", func_parse.MESSAGE_TYPES)
+def test_every_message_type_roundtrips(type_id, packet_type, schema):
+    rec = sample(schema)
+    data = bytes(func_parse.encode(packet_type, rec))
+
+    decoded = func_parse.decode(data, RECEIVED_AT)
+    view = func_parse.PacketView(data, RECEIVED_AT)
+    assert decoded["packet_type"] == view.packet_type == packet_type
+    assert view.to_dict() == decoded
+    for name, field_type in schema:
+        assert comparable(field_type, decoded[name]) == rec[name], name
+
+    frame = func_parse.decode_many([data], [RECEIVED_AT])[packet_type]
+    assert len(frame) == 1
+    row = frame.iloc[0]
+    for name, field_type in schema:
+        if field_type == "time":
+            assert row[name] == pd.Timestamp(decoded[name]), name
+        elif field_type == "datetime":
+            assert row[name] == func_parse.time_tuple_to_timestamp(decoded[name]), name
+        else:
+            assert row[name] == decoded[name], name
@@ -0,0 +1,68 @@
+import func_parse
+from sessions import SessionTracker
+
+HEARTBEAT = dict(packet_id="WSJT-X", max_schema_number=3, version="2.6.1", revision="abc")
+
+STATUS = dict(
+    packet_id="WSJT-X",
+    dial_frequency=14074000,
+    mode="FT8",
+    dx_call="K1ABC",
+    report="-10",
+    tx_mode="FT8",
+    tx_enabled=False,
+    transmitting=False,
+    decoding=True,
+    rx_df=1200,
+    tx_df=1500,
+    de_call="N0CALL",
+    de_grid="EM10",
+    dx_grid="FN42",
+    tx_watchdog=False,
+    sub_mode="",
+    fast_mode=False,
+    special_operation=0,
+    freq_tolerance=20,
+    tr_period=15,
+    conf_name="Default",
+    tx_message="K1ABC N0CALL EM10",
+)
+
+
+def packet(packet_type, values):
+    return bytes(func_parse.encode(packet_type, values))
+
+
+def test_feed_takes_epoch_seconds():
+    tracker = SessionTracker(stale_after=45)
+    start = 1_700_000_000.0
+
+    events = tracker.feed(packet("heartbeat", HEARTBEAT), start)
+    assert [e["event"] for e in events] == ["connect"]
+    assert events[0]["at"] == start
+
+    events = tracker.feed(packet("status", STATUS), start + 1)
+    assert [e["event"] for e in events] == ["status"]
+    assert events[0]["at"] == start + 1
+
+    # A repeated Status is skipped but still counts as seen
+    assert tracker.feed(packet("status", STATUS), start + 2) == []
+    assert tracker.get("WSJT-X").last_seen == start + 2
+
+    events = tracker.feed(packet("status", dict(STATUS, dial_frequency=7074000)), start + 60)
+    assert [e["event"] for e in events] == ["status", "stale"]
+    assert events[0]["changed"] == {"dial_frequency": 7074000}
+    assert events[1]["at"] == start + 60
+
+
+def test_feed_status_after_close():
+    tracker = SessionTracker()
+    start = 1_700_000_000.0
+    tracker.feed(packet("status", STATUS), start)
+    tracker.feed(packet("close", dict(packet_id="WSJT-X")), start + 1)
+    assert tracker.get("WSJT-X") is None
+
+    # The same Status bytes again reconnect the client rather than being skipped
+    events = tracker.feed(packet("status", STATUS), start + 2)
+    assert [e["event"] for e in events] == ["connect", "status"]
+    assert tracker.get("WSJT-X").raw_status == packet("status", STATUS)
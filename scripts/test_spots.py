@@ -0,0 +1,43 @@
+import datetime
+import time
+
+from spots import SpotExtractor
+
+
+class RecordingDeduper:
+    def __init__(self):
+        self.times = []
+
+    def is_new(self, key, now):
+        self.times.append(now)
+        return True
+
+
+def test_received_at_is_naive_utc(monkeypatch):
+    # A local zone away from UTC, so treating received_at as local time shows
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        deduper = RecordingDeduper()
+        extract = SpotExtractor(deduper)
+        extract(dict(packet_type="status", packet_id="WSJT-X", dial_frequency=14074000, mode="FT8"))
+        start = 1_700_000_000
+        received_at = datetime.datetime.fromtimestamp(start, datetime.timezone.utc).replace(
+            tzinfo=None
+        )
+        spot = extract(
+            dict(
+                packet_type="decode",
+                packet_id="WSJT-X",
+                message="CQ K1ABC FN42",
+                delta_frequency=1200,
+                snr=-12,
+                time=received_at,
+                received_at=received_at,
+            )
+        )
+        assert spot.dx == "K1ABC"
+        assert deduper.times == [start]
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
@@ -0,0 +1,370 @@
+#! /usr/bin/env python
+"""
+Synthetic WSJT-X traffic for load and correctness testing.
+
+TrafficModel produces realistic record dicts: every client sends a
+Heartbeat and a Status per T/R period, a burst of Decodes (mostly CQs and
+exchanges between made-up calls) and now and then a logged QSO.  Records
+are serialized with func_parse.encode_into() into one preallocated buffer,
+so generating a datagram allocates nothing but the record itself.
+
+    # 20k packets/s over localhost UDP for 10 s
+    python scripts/traffic.py udp --rate 20000 --seconds 10
+
+    # a capture file of 100k packets, timestamped at 5k packets/s
+    python scripts/traffic.py capture captures/ --count 100000 --rate 5000
+
+    # encode -> decode round trip of 10k random records
+    python scripts/traffic.py roundtrip --count 10000
+
+    # find the listener's packets per second ceiling
+    python scripts/traffic.py ceiling --rates 5000 10000 20000 40000
+"""
+
+import argparse
+import datetime
+import random
+import socket
+import sys
+import threading
+import time
+
+import func_parse
+
+DEFAULT_MIX = {"decode": 40, "status": 1, "heartbeat": 1, "qso": 0.2}
+
+PREFIXES = ["K", "W", "N", "AA", "VE", "G", "DL", "F", "JA", "VK", "PY", "OH", "SM", "EA", "I"]
+MODES = [("FT8", "~", 15), ("FT4", "+", 7.5)]
+DIAL_FREQUENCIES = [1840000, 3573000, 7074000, 10136000, 14074000, 18100000, 21074000, 28074000]
+
+
+def random_call(rng):
+    return f"{rng.choice(PREFIXES)}{rng.randint(0, 9)}{''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=rng.randint(1, 3)))}"
+
+
+def random_grid(rng):
+    letters = "ABCDEFGHIJKLMNOPQR"
+    return f"{rng.choice(letters)}{rng.choice(letters)}{rng.randint(0, 9)}{rng.randint(0, 9)}"
+
+
+def julian_now(now):
+    """
+    (julian day, ms since midnight, timespec UTC) for a UTC datetime.
+    """
+    day = (now - func_parse.EPOCH).days + func_parse.JULIAN_DAY_EPOCH
+    return day, func_parse.time_of_day_ms(now), 1
+
+
+class TrafficModel:
+    """
+    Random but plausible records for a set of WSJT-X clients.
+
+    clients: number of simulated instances (one packet_id each)
+    mix: relative weights of the packet types, see DEFAULT_MIX
+    seed: for reproducible traffic
+    """
+
+    def __init__(self, clients=4, mix=None, seed=None):
+        self.rng = random.Random(seed)
+        self.mix = dict(DEFAULT_MIX if mix is None else mix)
+        self.clients = [self._new_client(nn) for nn in range(clients)]
+        self._types = list(self.mix)
+        self._weights = [self.mix[t] for t in self._types]
+
+    def _new_client(self, nn):
+        rng = self.rng
+        mode, decode_mode, tr_period = rng.choice(MODES)
+        return {
+            "packet_id": f"WSJT-X-{nn}",
+            "dial_frequency": rng.choice(DIAL_FREQUENCIES),
+            "mode": mode,
+            "decode_mode": decode_mode,
+            "tr_period": tr_period,
+            "de_call": random_call(rng),
+            "de_grid": random_grid(rng),
+            "dx_call": "",
+            "dx_grid": "",
+        }
+
+    def heartbeat(self, client):
+        return {
+            "packet_id": client["packet_id"],
+            "max_schema_number": 3,
+            "version": "2.6.1",
+            "revision": "a1b2c3",
+        }
+
+    def status(self, client):
+        rng = self.rng
+        # Most status updates only move the audio offsets or tx state
+        if rng.random() < 0.05:
+            client["dx_call"], client["dx_grid"] = random_call(rng), random_grid(rng)
+        transmitting = rng.random() < 0.3
+        return {
+            "packet_id": client["packet_id"],
+            "dial_frequency": client["dial_frequency"],
+            "mode": client["mode"],
+            "dx_call": client["dx_call"],
+            "report": f"{rng.randint(-24, 10):+03d}",
+            "tx_mode": client["mode"],
+            "tx_enabled": transmitting,
+            "transmitting": transmitting,
+            "decoding": not transmitting,
+            "rx_df": rng.randint(200, 3000),
+            "tx_df": rng.randint(200, 3000),
+            "de_call": client["de_call"],
+            "de_grid": client["de_grid"],
+            "dx_grid": client["dx_grid"],
+            "tx_watchdog": False,
+            "sub_mode": "",
+            "fast_mode": False,
+            "special_operation": 0,
+            "freq_tolerance": 20,
+            "tr_period": int(client["tr_period"]),
+            "conf_name": "Default",
+            "tx_message": f"{client['dx_call']} {client['de_call']} {client['de_grid']}".strip(),
+        }
+
+    def _message(self):
+        rng = self.rng
+        kind = rng.random()
+        if kind < 0.4:
+            return f"CQ {random_call(rng)} {random_grid(rng)}"
+        if kind < 0.5:
+            return f"CQ {rng.choice(['DX', 'NA', 'EU', 'TEST'])} {random_call(rng)} {random_grid(rng)}"
+        if kind < 0.8:
+            return f"{random_call(rng)} {random_call(rng)} {rng.randint(-24, 10):+03d}"
+        return f"{random_call(rng)} {random_call(rng)} {rng.choice(['RR73', '73', 'RRR'])}"
+
+    def decode(self, client, now):
+        rng = self.rng
+        return {
+            "packet_id": client["packet_id"],
+            "new": True,
+            "time": func_parse.time_of_day_ms(now),
+            "snr": rng.randint(-24, 15),
+            "delta_time": round(rng.uniform(-0.5, 1.5), 1),
+            "delta_frequency": rng.randint(100, 3000),
+            "mode": client["decode_mode"],
+            "message": self._message(),
+            "low_confidence": rng.random() < 0.02,
+            "off_air": False,
+        }
+
+    def qso(self, client, now):
+        rng = self.rng
+        started = now - datetime.timedelta(seconds=rng.randint(30, 180))
+        return {
+            "packet_id": client["packet_id"],
+            "time_tuple_off": julian_now(now),
+            "dx_call": random_call(rng),
+            "dx_grid": random_grid(rng),
+            "tx_freq": client["dial_frequency"],
+            "mode": client["mode"],
+            "report_sent": f"{rng.randint(-24, 10):+03d}",
+            "report_received": f"{rng.randint(-24, 10):+03d}",
+            "tx_power": "100",
+            "comments": "",
+            "name": "",
+            "time_tuple_on": julian_now(started),
+            "operator_call": client["de_call"],
+            "my_call": client["de_call"],
+            "my_grid": client["de_grid"],
+            "exchange_sent": "",
+            "exchange_received": "",
+            "adif_propagation_mode": "",
+        }
+
+    def record(self, now=None):
+        """
+        One random (packet_type, record) drawn from the mix.
+        """
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        packet_type = self.rng.choices(self._types, self._weights)[0]
+        client = self.rng.choice(self.clients)
+        if packet_type in ("heartbeat", "status"):
+            return packet_type, getattr(self, packet_type)(client)
+        return packet_type, getattr(self, packet_type)(client, now)
+
+    def records(self, count=None):
+        """
+        Yield count (default: endless) (packet_type, record) pairs.
+        """
+        nn = 0
+        while count is None or nn < count:
+            yield self.record()
+            nn += 1
+
+
+class Pacer:
+    """
+    Spread events evenly at rate per second (0 means as fast as possible).
+    Sleeps only once it is a whole batch ahead, so the per-event cost stays
+    a counter increment and a comparison.
+    """
+
+    def __init__(self, rate, batch=64):
+        self.rate = rate
+        self.batch = batch
+        self.count = 0
+        self.started = time.perf_counter()
+
+    def tick(self):
+        self.count += 1
+        if self.rate and self.count % self.batch == 0:
+            ahead = self.started + self.count / self.rate - time.perf_counter()
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def send_udp(ip="127.0.0.1", port=2237, rate=10_000, seconds=5.0, model=None):
+    """
+    Send model traffic to ip:port at rate packets/s for seconds.  Returns
+    the number of datagrams sent.
+    """
+    model = TrafficModel() if model is None else model
+    buffer = bytearray(func_parse.MAX_PACKET_BYTES)
+    view = memoryview(buffer)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = (ip, port)
+    pacer = Pacer(rate)
+    try:
+        while pacer.elapsed() < seconds:
+            packet_type, rec = model.record()
+            nbytes = func_parse.encode_into(buffer, 0, packet_type, rec)
+            try:
+                sock.sendto(view[:nbytes], target)
+            except BlockingIOError:
+                continue
+            pacer.tick()
+    finally:
+        sock.close()
+    return pacer.count
+
+
+def write_capture(directory, count=100_000, rate=1000, start=None, model=None):
+    """
+    Write count packets to a capture directory with receive times spaced
+    at rate packets/s from start (epoch seconds, default now).
+    """
+    from capture import CaptureWriter
+
+    model = TrafficModel() if model is None else model
+    start = time.time() if start is None else start
+    buffer = bytearray(func_parse.MAX_PACKET_BYTES)
+    view = memoryview(buffer)
+    with CaptureWriter(directory) as writer:
+        for nn in range(count):
+            timestamp = start + nn / rate
+            now = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+            packet_type, rec = model.record(now)
+            nbytes = func_parse.encode_into(buffer, 0, packet_type, rec)
+            writer.write(view[:nbytes], timestamp)
+    return count
+
+
+def _same(field_type, sent, received):
+    if field_type == "time":
+        return sent == func_parse.time_of_day_ms(received)
+    if field_type == "datetime":
+        return tuple(sent) == (received[0], func_parse.time_of_day_ms(received[1]), received[2])
+    if field_type == "utf8" and sent is None:
+        return received == ""
+    return sent == received
+
+
+def roundtrip(count=10_000, model=None):
+    """
+    Encode and decode count random records, comparing every field, and
+    check PacketView agrees with decode().  Returns a list of
+    (packet_type, field, sent, received) mismatches.
+    """
+    model = TrafficModel(seed=0) if model is None else model
+    mismatches = []
+    for packet_type, rec in model.records(count):
+        data = func_parse.encode(packet_type, rec)
+        decoded = func_parse.decode(data)
+        view = func_parse.PacketView(data)
+        for name, field_type in func_parse.SCHEMAS[packet_type]:
+            if not _same(field_type, rec[name], decoded[name]):
+                mismatches.append((packet_type, name, rec[name], decoded[name]))
+            elif view[name] != decoded[name]:
+                mismatches.append((packet_type, name, decoded[name], view[name]))
+    return mismatches
+
+
+def ceiling(rates, seconds=3.0, ip="127.0.0.1", port=22370, workers=2):
+    """
+    Drive an in-process Listener at each rate and print how many packets
+    were received, decoded and dropped.  The rate where decoded/s stops
+    following the offered rate is the listener's ceiling.
+    """
+    import asyncio
+    from listener import Listener
+
+    print(f"{'offered/s':>10} {'sent/s':>10} {'received':>10} {'decoded/s':>10} {'dropped':>8}")
+    for rate in rates:
+        listener = Listener(func_parse.decode, handler=lambda rec: None, ip=ip, port=port, workers=workers)
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(listener.start())
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        start = time.perf_counter()
+        sent = send_udp(ip, port, rate, seconds)
+        sent_elapsed = time.perf_counter() - start
+        # Let the workers drain what is already queued
+        while len(listener.queue) and time.perf_counter() - start < 2 * seconds + 5:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        listener.close()
+        # One more turn of the loop lets the transport release the port
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        stats = listener.stats()
+        print(
+            f"{rate:>10,} {sent / sent_elapsed:>10,.0f} {stats['received']:>10,} "
+            f"{stats['decoded'] / elapsed:>10,.0f} {stats['dropped']:>8,}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic WSJT-X traffic")
+    parser.add_argument("command", choices=["udp", "capture", "roundtrip", "ceiling"])
+    parser.add_argument("directory", nargs="?", help="capture directory")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2237)
+    parser.add_argument("--rate", type=float, default=10_000, help="packets/s, 0 = unthrottled")
+    parser.add_argument("--rates", type=int, nargs="+", default=[5000, 10_000, 20_000, 40_000])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--count", type=int, default=10_000)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    model = TrafficModel(args.clients, seed=args.seed)
+    if args.command == "udp":
+        sent = send_udp(args.ip, args.port, args.rate, args.seconds, model)
+        print(f"sent {sent:,} datagrams ({sent / args.seconds:,.0f}/s)")
+    elif args.command == "capture":
+        if args.directory is None:
+            parser.error("capture needs a directory")
+        write_capture(args.directory, args.count, args.rate or 1000, model=model)
+        print(f"wrote {args.count:,} packets to {args.directory}")
+    elif args.command == "roundtrip":
+        mismatches = roundtrip(args.count, model)
+        for mismatch in mismatches[:20]:
+            print(mismatch)
+        print(f"{args.count:,} records, {len(mismatches)} mismatches")
+        sys.exit(1 if mismatches else 0)
+    else:
+        ceiling(args.rates, args.seconds, args.ip, args.port)
+
+
+if __name__ == "__main__":
+    main()